@@ -0,0 +1,291 @@
+"""Offline replay benchmark for the vision pipeline.
+
+Feeds recorded video files (or synthetic frames) through the same code the
+GUI runs per frame and prints per-stage latency percentiles, overall
+throughput and peak RSS as JSON. Needs no camera, display or car:
+
+    python bench.py --video session.mp4 --out before.json
+    python bench.py --synthetic 300 --width 1280 --height 720
+    python bench.py --video session.mp4 --detector opencv --no-roi --process
+
+Stages come from the app's shared modules: pooled flip and crop-to-fit
+(frames.FramePool), the motion gate (scheduler.py), the detector backend
+(detectors.make_detector, optionally in the worker process of
+inference_proc.py), decide + GestureFilter, and the BGR888 QImage path.
+The flags select the same options as the GUI config, so before/after runs
+compare the real code paths. In-process MediaPipe inference is also
+broken down into "bgr2rgb", "hands_process" and "landmarks" (frames with
+a hand only). With --process the benchmark waits for each frame's result,
+so "result_wait" is inference plus the IPC round trip; the worker only
+reports the combined "inference" time, and a worker that stops answering
+ends the run after RESULT_TIMEOUT_SEC.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap
+
+from detectors import BACKENDS, Detection, decide, draw_detection, hand_points, make_detector
+from frames import FramePool, crop_to_fit
+from gesture import count_fingers_ignore_thumb
+from gesture_filter import GestureFilter
+
+VIDEO_W, VIDEO_H = 800, 600   # QLabel size in cv_gui.py
+RESULT_TIMEOUT_SEC = 5.0      # --process: give up on a frame the worker hasn't answered by then
+
+# Normalized (x, y) of a right hand with index + middle raised, used when
+# synthetic frames contain no detectable hand so the later stages still run.
+SYNTHETIC_HAND = [
+    (0.50, 0.80), (0.42, 0.74), (0.37, 0.66), (0.34, 0.59), (0.31, 0.54),
+    (0.45, 0.55), (0.44, 0.45), (0.44, 0.38), (0.44, 0.32),
+    (0.51, 0.54), (0.51, 0.43), (0.51, 0.35), (0.51, 0.28),
+    (0.57, 0.56), (0.58, 0.62), (0.58, 0.66), (0.58, 0.69),
+    (0.62, 0.59), (0.63, 0.64), (0.63, 0.67), (0.63, 0.70),
+]
+
+
+############################################################
+# Sources
+############################################################
+def video_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {path}")
+    n = 0
+    while limit is None or n < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        n += 1
+        yield frame
+    cap.release()
+
+
+def synthetic_frames(count, w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    for i in range(count):
+        # Roll the noise so consecutive frames differ like a real feed.
+        yield np.roll(base, i * 7, axis=1)
+
+
+def synthetic_hand():
+    lm = np.zeros((len(SYNTHETIC_HAND), 3), np.float32)
+    lm[:, :2] = SYNTHETIC_HAND
+    return Detection(lm, count_fingers_ignore_thumb(lm), 2, 1.0, None)
+
+
+############################################################
+# Benchmark
+############################################################
+class StageTimes:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def time(self, name, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        self.samples[name].append(time.perf_counter() - t0)
+        return out
+
+    def summary(self):
+        out = {}
+        for name, xs in self.samples.items():
+            ms = np.asarray(xs) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            out[name] = {"count": len(ms), "mean_ms": round(float(ms.mean()), 3),
+                         "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                         "p99_ms": round(float(p99), 3)}
+        return out
+
+
+def overlay(frame):
+    # Same text load as SmartCarGUI.tick_camera.
+    pad, line_h = 20, 30
+    cv2.putText(frame, "Mode: Gesture Mode", (pad, line_h), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(frame, "Command: FORWARD", (pad, line_h * 2), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    cv2.putText(frame, "Speed:180", (pad, line_h * 3), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+    cv2.putText(frame, "Battery:87%", (pad, line_h * 4), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(frame, "CONNECTED", (frame.shape[1] - 180, line_h), cv2.FONT_HERSHEY_DUPLEX, 0.8, (0, 255, 0), 2)
+    return frame
+
+
+def to_pixmap(frame):
+    # Same as SmartCarGUI.tick_camera: BGR buffer straight to Qt, one copy in fromImage
+    h, w = frame.shape[:2]
+    return QPixmap.fromImage(QImage(frame.data, w, h, w * 3, QImage.Format_BGR888))
+
+
+class Inference:
+    """The GUI's detector setup: in-process backend or the shared-memory worker."""
+
+    def __init__(self, backend, roi, process, shape):
+        self.client = self.detector = None
+        if process:
+            from inference_proc import InferenceClient
+            self.client = InferenceClient(max_shape=shape, backend=backend, roi=roi).start()
+            if not self.client.wait_ready(120.0):
+                raise SystemExit("inference worker did not become ready")
+        else:
+            self.detector = make_detector(backend, roi=roi)
+            self.detector.warm_up(shape)
+
+    def detect(self, frame, st):
+        if self.detector is not None:
+            det = st.time("inference", self.detector.detect, frame)
+            for name, sec in (self.detector.stages or {}).items():
+                st.samples[name].append(sec)
+            return det
+        seq = st.time("submit", self.client.submit, frame)
+        t0 = time.perf_counter()
+        while seq is not None:
+            r = self.client.latest()
+            if r is not None and r.seq >= seq:
+                st.samples["result_wait"].append(time.perf_counter() - t0)
+                st.samples["inference"].append(r.infer_ms / 1000.0)
+                return r.detection
+            if self.client.failed:
+                raise SystemExit("inference worker failed and was given up on")
+            if time.perf_counter() - t0 > RESULT_TIMEOUT_SEC:
+                raise SystemExit(f"inference worker did not answer frame {seq} within {RESULT_TIMEOUT_SEC:g} s")
+            time.sleep(0.0005)
+        return None
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        else:
+            self.detector.close()
+
+
+def run(frames, inference, scheduler=None, fake_hand=None):
+    pool = FramePool()
+    gesture_filter = GestureFilter()
+    st = StageTimes()
+    n, detected, inferred = 0, 0, 0
+    det = None
+    t_start = time.perf_counter()
+    for frame in frames:
+        t0 = time.perf_counter()
+        frame = flipped = st.time("flip", cv2.flip, frame, 1, pool.get("flip", frame.shape))
+        if scheduler is None or st.time("gate", scheduler.should_infer, frame):
+            inferred += 1
+            det = inference.detect(frame, st)
+            detected += det is not None
+            if det is None and fake_hand is not None:
+                det = fake_hand
+            if scheduler is not None:
+                scheduler.set_hand(hand_points(det, frame.shape))
+            _, raw, conf = st.time("classify", decide, det)
+            gesture_filter.update(raw, conf)
+        st.time("draw", draw_detection, frame, det)
+        frame = st.time("crop_to_fit", crop_to_fit, frame, VIDEO_W, VIDEO_H,
+                        pool.get("display", (VIDEO_H, VIDEO_W, 3)))
+        st.time("overlay", overlay, frame)
+        st.time("qimage", to_pixmap, frame)
+        pool.release(flipped)
+        pool.release(frame)
+        dt = time.perf_counter() - t0
+        st.samples["frame_total"].append(dt)
+        if scheduler is not None:
+            scheduler.frame_done(dt)
+        n += 1
+    wall = time.perf_counter() - t_start
+    return {
+        "frames": n,
+        "inferred": inferred,
+        "hands_detected": detected,
+        "wall_s": round(wall, 3),
+        "fps": round(n / wall, 2) if wall else 0.0,
+        "stages": st.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--video", action="append", help="recorded video file (repeatable)")
+    src.add_argument("--synthetic", type=int, metavar="N", help="use N synthetic noise frames")
+    ap.add_argument("--width", type=int, default=1280)
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--frames", type=int, default=None, help="max frames per video")
+    ap.add_argument("--detector", default="mediapipe", choices=BACKENDS + ("auto",))
+    ap.add_argument("--roi", action=argparse.BooleanOptionalAction, default=True,
+                    help="ROI hand tracking (cv_gui ROI_INFERENCE)")
+    ap.add_argument("--process", action="store_true",
+                    help="run the detector in the shared-memory worker (cv_gui INFERENCE_PROCESS)")
+    ap.add_argument("--gating", action="store_true",
+                    help="motion-gated inference scheduler (cv_gui MOTION_GATING)")
+    ap.add_argument("--no-fake-hand", action="store_true",
+                    help="don't substitute a synthetic hand when none is detected")
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    args = ap.parse_args(argv)
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    fake = None if args.no_fake_hand else synthetic_hand()
+    if args.video:
+        cap = cv2.VideoCapture(args.video[0])
+        shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or args.height,
+                 int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or args.width, 3)
+        cap.release()
+    else:
+        shape = (args.height, args.width, 3)
+    inference = Inference(args.detector, args.roi, args.process, shape)
+
+    report = {"python": sys.version.split()[0], "opencv": cv2.__version__,
+              "config": {"detector": args.detector, "roi": args.roi, "process": args.process,
+                         "gating": args.gating},
+              "runs": []}
+    if args.detector != "opencv":
+        import mediapipe
+        report["mediapipe"] = getattr(mediapipe, "__version__", "?")
+
+    def scheduler():
+        if not args.gating:
+            return None
+        from scheduler import InferenceScheduler
+        return InferenceScheduler()
+
+    try:
+        if args.synthetic:
+            r = run(synthetic_frames(args.synthetic, args.width, args.height), inference, scheduler(), fake)
+            r["source"] = f"synthetic {args.width}x{args.height}"
+            report["runs"].append(r)
+        else:
+            for path in args.video:
+                r = run(video_frames(path, args.frames), inference, scheduler(), fake)
+                r["source"] = path
+                report["runs"].append(r)
+    finally:
+        inference.close()
+    del app
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Low-latency camera capture and an end-to-end latency probe.
+
+Camera opens a device index, video file or stream URL with the backend
+that honours capture settings on each platform (V4L2 on Linux,
+DirectShow on Windows, AVFoundation on macOS, FFmpeg for streams), and
+asks for MJPG at the wanted size and FPS with a one-frame driver buffer.
+Drivers that ignore the buffer size still queue old frames, so read()
+drains them: a grab() that returns immediately came from the queue, and
+the first one that has to wait for the sensor is the freshest frame.
+Files can be paced at their own FPS so they behave like a live camera.
+
+LatencyProbe replaces camera frames with a known hand image every few
+seconds and times how long it takes until the matching command datagram
+leaves the car link's socket (CarLink.on_sent). This is everything from
+frame capture to the UDP send: inference, debouncing and the link thread.
+
+    python capture.py 0 --width 1280 --height 720    # show what the camera negotiated
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import RingBuffer
+from protocol import FLAG_SPEED_ONLY, decode_control
+
+STREAM_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+
+def parse_source(source):
+    """"0" -> 0 (device index); anything else is a path or URL."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+def _backends(source):
+    if isinstance(source, int):
+        if sys.platform.startswith("linux"):
+            return [cv2.CAP_V4L2, cv2.CAP_ANY]
+        if sys.platform == "win32":
+            return [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
+        if sys.platform == "darwin":
+            return [cv2.CAP_AVFOUNDATION, cv2.CAP_ANY]
+        return [cv2.CAP_ANY]
+    if str(source).startswith(STREAM_PREFIXES):
+        return [cv2.CAP_FFMPEG, cv2.CAP_ANY]
+    return [cv2.CAP_ANY]
+
+
+def _fourcc_str(value):
+    v = int(value)
+    return "".join(chr((v >> 8 * i) & 0xFF) for i in range(4)).strip("\0") or "?"
+
+
+############################################################
+# Camera
+############################################################
+class Camera:
+    """cv2.VideoCapture with negotiated settings; read() returns the freshest frame."""
+
+    def __init__(self, source=0, width=640, height=480, fps=30, fourcc="MJPG", buffer_size=1,
+                 drain=True, realtime=True, probe=None):
+        self.source = parse_source(source)
+        self.live = not isinstance(self.source, str) or self.source.startswith(STREAM_PREFIXES)
+        self.drain = drain and self.live
+        self.realtime = realtime and not self.live   # pace files at their own FPS
+        self.probe = probe
+        self.drained = 0
+        self.frames = 0
+
+        if self.live and not isinstance(self.source, int):
+            # Streams: no client-side buffering, TCP so lost packets don't smear frames
+            os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS",
+                                  "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay")
+        self.cap = None
+        for api in _backends(self.source):
+            cap = cv2.VideoCapture(self.source, api)
+            if cap.isOpened():
+                self.cap = cap
+                break
+            cap.release()
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.source)   # keeps isOpened() False for the caller to report
+
+        if self.live:
+            # FOURCC before size: V4L2 picks the frame sizes from the pixel format
+            if fourcc:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if fps:
+                self.cap.set(cv2.CAP_PROP_FPS, fps)
+            self.buffer_ok = bool(buffer_size) and self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        else:
+            self.buffer_ok = False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or fps or 30.0
+        self._interval = 1.0 / self.fps
+        self._next = 0.0
+
+    def info(self):
+        """What the driver actually agreed to."""
+        return {
+            "source": self.source,
+            "backend": self.cap.getBackendName() if self.cap.isOpened() else None,
+            "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": round(self.fps, 2),
+            "fourcc": _fourcc_str(self.cap.get(cv2.CAP_PROP_FOURCC)),
+            "buffer_size": int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE)) if self.buffer_ok else None,
+            "drain": self.drain,
+        }
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, buf=None):
+        if self.drain:
+            ok = self._grab_fresh()
+            ok, img = self.cap.retrieve(buf) if ok else (False, None)
+        else:
+            if self.realtime:
+                delay = self._next - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._next = max(self._next, time.perf_counter() - self._interval) + self._interval
+            ok, img = self.cap.read(buf)
+        if ok:
+            self.frames += 1
+            if self.probe is not None:
+                img = self.probe.frame(img)
+        return ok, img
+
+    def _grab_fresh(self, max_drain=8):
+        # Queued frames come back from grab() at once; a fresh one makes us wait for the sensor.
+        for i in range(max_drain):
+            t0 = time.perf_counter()
+            if not self.cap.grab():
+                return False
+            if time.perf_counter() - t0 > self._interval / 3:
+                break
+            if i < max_drain - 1:
+                self.drained += 1   # about to be overwritten by the next grab
+        return True
+
+    def release(self):
+        self.cap.release()
+
+
+############################################################
+# Latency probe
+############################################################
+def synthetic_hand(shape, fingers=2):
+    """Flat skin-coloured hand with `fingers` raised; only the OpenCV detector is fooled by it."""
+    h, w = shape[:2]
+    img = np.full((h, w, 3), 30, np.uint8)
+    skin = (120, 160, 220)
+    s = min(w, h) / 480.0
+    cx, cy = w // 2, int(h * 0.68)
+    cv2.circle(img, (cx, cy), int(85 * s), skin, -1)
+    tops = (190, 150, 140, 160)
+    for i in range(fingers):
+        x = cx + int((44 * i - 22 * (fingers - 1)) * s)
+        top = int((tops[i] if fingers > 1 else 150) * s + cy - 330 * s)
+        cv2.rectangle(img, (x - int(13 * s), top), (x + int(13 * s), int(cy - 30 * s)), skin, -1)
+    return img
+
+
+def _direction(payload):
+    pkt = decode_control(payload)
+    if pkt is not None:
+        return None if pkt.flags & FLAG_SPEED_ONLY else pkt.direction
+    return payload[:1].decode(errors="ignore") if len(payload) == 1 else None
+
+
+class LatencyProbe:
+    """Injects `image` (which should classify as `expect`) and times image -> UDP send.
+
+    Wire it up with Camera(probe=probe) and link.on_sent(probe.on_sent). The
+    car *will* receive the probe command, so run it with the wheels off the floor.
+    """
+
+    def __init__(self, image=None, expect="B", interval=3.0, timeout=2.0, metrics=None):
+        self.image = cv2.imread(image) if isinstance(image, str) else image
+        if isinstance(image, str) and self.image is None:
+            raise ValueError(f"cannot read probe image {image!r}")
+        self.expect = expect
+        self.interval = interval
+        self.timeout = timeout
+        self.metrics = metrics
+        self.samples = RingBuffer(100)   # seconds
+        self.misses = 0
+        self._scaled = None
+        self._t_inject = None            # time the first probe frame was captured
+        self._last_dir = None
+        self._next = time.time() + interval
+        self._lock = threading.Lock()
+
+    def frame(self, img):
+        """Called for every captured frame; returns the probe image while a probe runs."""
+        now = time.time()
+        with self._lock:
+            if self._t_inject is None:
+                if now < self._next:
+                    return img
+                self._t_inject = now
+            elif now - self._t_inject > self.timeout:
+                self.misses += 1
+                self._t_inject, self._next = None, now + self.interval
+                return img
+        if self._scaled is None or self._scaled.shape != img.shape:
+            src = self.image if self.image is not None else synthetic_hand(img.shape)
+            self._scaled = cv2.resize(src, (img.shape[1], img.shape[0]))
+        np.copyto(img, self._scaled)
+        return img
+
+    def on_sent(self, payload, t_sent):
+        """CarLink.on_sent callback (link thread)."""
+        d = _direction(payload)
+        if d is None:
+            return
+        # Only a change to the expected command counts, not a throttled re-send of it
+        prev, self._last_dir = self._last_dir, d
+        if d != self.expect or prev == self.expect:
+            return
+        with self._lock:
+            if self._t_inject is None:
+                return
+            latency = t_sent - self._t_inject
+            self._t_inject, self._next = None, t_sent + self.interval
+        self.samples.push(latency)
+        if self.metrics is not None:
+            self.metrics.record("glass_to_cmd", latency)
+
+    def stats(self):
+        v = self.samples.values() * 1000.0
+        out = {"probes": len(v), "misses": self.misses}
+        if len(v):
+            p50, p95 = np.percentile(v, [50, 95])
+            out.update(p50_ms=round(float(p50), 1), p95_ms=round(float(p95), 1),
+                       max_ms=round(float(v.max()), 1))
+        return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Open a capture source and report what was negotiated")
+    ap.add_argument("source", nargs="?", default="0", help="device index, video file or stream URL")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--fourcc", default="MJPG", help="pixel format to ask for ('' = driver default)")
+    ap.add_argument("--seconds", type=float, default=5.0, help="how long to read frames")
+    args = ap.parse_args(argv)
+
+    cam = Camera(args.source, args.width, args.height, args.fps, args.fourcc)
+    if not cam.isOpened():
+        sys.exit(f"cannot open {args.source!r}")
+    print(cam.info())
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < args.seconds:
+        ok, _ = cam.read()
+        if not ok:
+            break
+    wall = time.perf_counter() - t0
+    print(f"read {cam.frames} frames in {wall:.1f} s ({cam.frames / wall:.1f} fps), drained {cam.drained} stale")
+    cam.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Non-blocking UDP transport for the car link.
+
+One LinkLoop thread owns every car socket and runs a selector over them.
+Callers never touch the socket: CarLink.send() only queues the datagram
+and wakes the loop, and everything the car sends back is handed to the
+subscribers registered with CarLink.subscribe(). Requests that expect a
+reply (the battery ping) are timestamped so the link can report live RTT
+and packet loss; `connected()` is based on any traffic from the car.
+If the loop falls behind and the outbox fills up, the oldest datagram that
+is not a STOP is dropped (and counted), so a queued STOP always goes out.
+Telemetry the car pushes on its own is delivered to subscribers too, but
+never taken as the answer to a pending request.
+"""
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from metrics import RingBuffer
+from protocol import is_stop, is_telemetry
+
+ESP_IP = "192.168.4.1"
+ESP_PORT = 8888
+BUFFER_SIZE = 1024
+MAX_OUTBOX = 64
+
+
+############################################################
+# Event loop
+############################################################
+class LinkLoop:
+    """Selector thread shared by one or more CarLinks."""
+
+    def __init__(self, tick=0.05):
+        self.tick = tick
+        self.sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self.links = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def add(self, link):
+        with self._lock:
+            self.links.append(link)
+            self.sel.register(link.sock, selectors.EVENT_READ, link)
+        self.wake()
+
+    def remove(self, link):
+        with self._lock:
+            if link in self.links:
+                self.links.remove(link)
+                self.sel.unregister(link.sock)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="carlink", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.wake()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass   # already pending, or shutting down
+
+    def _run(self):
+        while self._running:
+            for key, _ in self.sel.select(self.tick):
+                if key.data is None:
+                    try:
+                        self._wake_r.recv(512)
+                    except BlockingIOError:
+                        pass
+                else:
+                    key.data._on_readable()
+            now = time.time()
+            with self._lock:
+                links = list(self.links)
+            for link in links:
+                link._on_tick(now)
+                link._flush(now)
+        self.sel.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+
+############################################################
+# Car link
+############################################################
+class CarLink:
+    def __init__(self, host=ESP_IP, port=ESP_PORT, loop=None, ping=b"V", ping_interval=1.0,
+                 reply_timeout=1.0, metrics=None):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.ping = ping
+        self.ping_interval = ping_interval
+        self.reply_timeout = reply_timeout
+        self.metrics = metrics
+
+        self._outbox = deque()            # bounded by MAX_OUTBOX in send()
+        self._out_lock = threading.Lock()
+        self._pending = deque()           # send times of requests awaiting a reply
+        self._subscribers = []
+        self._sent_hooks = []
+        self._last_ping = 0.0
+
+        self.rtt = RingBuffer(64)         # seconds
+        self.outcomes = RingBuffer(50)    # 1 = request lost, 0 = answered
+        self.sent = 0
+        self.received = 0
+        self.lost = 0
+        self.errors = 0
+        self.dropped = 0                  # datagrams evicted from a full outbox
+        self.last_error = None
+        self.last_rx = 0.0
+
+        self._own_loop = loop is None
+        self.loop = LinkLoop() if loop is None else loop
+        self.loop.add(self)
+        if self._own_loop:
+            self.loop.start()
+
+    # -------- public API (any thread) --------
+    def send(self, payload, expect_reply=False):
+        """Queue a datagram; never blocks."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._out_lock:
+            if len(self._outbox) >= MAX_OUTBOX:
+                self._evict()
+            self._outbox.append((payload, expect_reply))
+        self.loop.wake()
+
+    def request(self, payload):
+        self.send(payload, expect_reply=True)
+
+    def subscribe(self, callback):
+        """callback(data: bytes) runs on the link thread for every datagram received."""
+        self._subscribers.append(callback)
+
+    def on_sent(self, callback):
+        """callback(payload: bytes, t: float) runs on the link thread right after a datagram leaves the socket."""
+        self._sent_hooks.append(callback)
+
+    def connected(self, timeout=3.0):
+        return (time.time() - self.last_rx) < timeout
+
+    def rtt_ms(self):
+        return float(self.rtt.values().mean()) * 1000.0 if len(self.rtt) else None
+
+    def loss(self):
+        """Fraction of recent requests that got no reply."""
+        return float(self.outcomes.values().mean()) if len(self.outcomes) else 0.0
+
+    def stats(self):
+        rtt = self.rtt_ms()
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "lost": self.lost,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "rtt_ms": None if rtt is None else round(rtt, 1),
+            "loss_pct": round(self.loss() * 100.0, 1),
+            "connected": self.connected(),
+        }
+
+    def close(self):
+        self.loop.remove(self)
+        if self._own_loop:
+            self.loop.stop()
+        self.sock.close()
+
+    def _evict(self):
+        """Drop the oldest queued datagram that isn't a STOP (caller holds _out_lock)."""
+        for i, (payload, _) in enumerate(self._outbox):
+            if not is_stop(payload):
+                del self._outbox[i]
+                break
+        else:
+            self._outbox.popleft()    # all STOPs: a newer one is still queued
+        self.dropped += 1
+
+    # -------- loop thread --------
+    def _flush(self, now):
+        while True:
+            with self._out_lock:
+                if not self._outbox:
+                    return
+                payload, expect_reply = self._outbox.popleft()
+            try:
+                self.sock.sendto(payload, self.addr)
+            except OSError as e:
+                # Unreachable while the car is off or we are not on its WiFi yet.
+                self.errors += 1
+                self.last_error = str(e)
+                continue
+            self.sent += 1
+            if expect_reply:
+                self._pending.append(now)
+            if self.metrics is not None:
+                self.metrics.mark("udp_send")
+            if self._sent_hooks:
+                t = time.time()
+                for cb in list(self._sent_hooks):
+                    try:
+                        cb(payload, t)
+                    except Exception as e:
+                        print(f"Link send hook error: {e}")
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # e.g. ICMP port unreachable surfacing as ConnectionResetError on Windows
+                self.errors += 1
+                self.last_error = str(e)
+                return
+            now = time.time()
+            self.received += 1
+            self.last_rx = now
+            if self._pending and not is_telemetry(data):
+                # Pings are a second apart, so a reply answers the newest one;
+                # anything older still outstanding was lost.
+                self.rtt.push(now - self._pending.pop())
+                self.outcomes.push(0)
+                while self._pending:
+                    self._pending.popleft()
+                    self.lost += 1
+                    self.outcomes.push(1)
+            for cb in list(self._subscribers):
+                try:
+                    cb(data)
+                except Exception as e:
+                    print(f"Link subscriber error: {e}")
+
+    def _on_tick(self, now):
+        while self._pending and now - self._pending[0] > self.reply_timeout:
+            self._pending.popleft()
+            self.lost += 1
+            self.outcomes.push(1)
+        if self.ping and self.ping_interval and now - self._last_ping >= self.ping_interval:
+            self._last_ping = now
+            self.request(self.ping)
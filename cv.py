@@ -1,111 +1,116 @@
-import cv2
-import mediapipe as mp
-import socket
+import argparse
+import signal
 import time
-import threading
+from collections import Counter
+
+import cv2
+
+from detectors import make_detector, decide, draw_detection, hand_points
+from gesture import COMMAND_INFO
+from gesture_filter import GestureFilter
+from session_log import SessionWriter, parse_battery
+from scheduler import InferenceScheduler
+from capture import Camera, LatencyProbe
+from recorder import VideoRecorder
+from metrics import Metrics, JsonlExporter, HttpExporter, draw_hud
+from carlink import CarLink
+from telemetry import TelemetrySeries
+from preview import MjpegPreview
 
 # ================= CONFIGURATION =================
 ESP_IP = "192.168.4.1"
 ESP_PORT = 8888
-BUFFER_SIZE = 1024
+SEND_THROTTLE_SEC = 0.5     # resend an unchanged command at most this often
+BATTERY_POLL_SEC = 3
+
+CAMERA_SOURCE = 0           # device index, video file or rtsp:// URL
+CAMERA_W, CAMERA_H = 640, 480
+CAMERA_FPS = 30
+
+LATENCY_PROBE = False       # inject a probe hand every 3 s and report glass-to-command ms (the car WILL move)
+LATENCY_PROBE_IMAGE = None  # photo of a 2-finger hand; the built-in probe only fools the "opencv" detector
+
+DETECTOR_BACKEND = "mediapipe"  # "mediapipe", "opencv" (skin/contour, low CPU) or "auto"
+DETECTOR_MAX_MS = 60        # "auto" falls back to OpenCV when MediaPipe costs more than this per frame
+
+GESTURE_WINDOW = 5          # N-of-M vote: a new command needs GESTURE_VOTES of the last GESTURE_WINDOW frames
+GESTURE_VOTES = 3
+GESTURE_DWELL_SEC = 0.25    # minimum time a command is held before it can change
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.settimeout(0.2)
+RECORD_SESSION = None       # e.g. "drive.gcl": log landmarks + decisions (replay with session_log.py)
+RECORD_VIDEO = None         # e.g. "drives/run": annotated video + telemetry, in segments (recorder.py)
+RECORD_CODEC = "MJPG"
+RECORD_SIZE = None          # (w, h) to downscale recordings, None = as shown
+RECORD_EVERY = 2            # record every Nth frame
+RECORD_SEGMENT_SEC = 300
+
+MOTION_GATING = True        # skip inference while the hand region is still
+FRAME_BUDGET_MS = 40        # lower the inference rate when a frame costs more than this
+
+SHOW_HUD = True             # FPS / inference / frame age / UDP rate overlay
+METRICS_JSONL = None        # e.g. "metrics.jsonl" to log a snapshot every second
+METRICS_HTTP_PORT = None    # e.g. 9100 to serve http://127.0.0.1:9100/metrics
+
+HEADLESS = False            # no window and no drawing; stop with Ctrl+C / SIGTERM (or --headless)
+PREVIEW_PORT = None         # e.g. 8090 to serve a 2 fps MJPEG preview on http://127.0.0.1:8090/
+PREVIEW_FPS = 2
+STATS_INTERVAL_SEC = 10     # print FPS / command stats this often (0 = only at exit)
+
+ap = argparse.ArgumentParser(description="Gesture car controller (OpenCV window, or headless)")
+ap.add_argument("--headless", action="store_true", default=HEADLESS,
+                help="no window or overlay; run as fast as the camera allows, stop with a signal")
+ap.add_argument("--preview-port", type=int, default=PREVIEW_PORT, metavar="PORT",
+                help="serve a low-rate MJPEG preview on http://127.0.0.1:PORT/")
+ap.add_argument("--stats-sec", type=float, default=STATS_INTERVAL_SEC, help="stats line interval (0 = off)")
+args = ap.parse_args()
+HEADLESS, PREVIEW_PORT, STATS_INTERVAL_SEC = args.headless, args.preview_port, args.stats_sec
 
 battery_level = "N/A"
-keep_running = True
 
-# ================= BATTERY THREAD =================
-def fetch_battery():
+metrics = Metrics()
+if METRICS_JSONL:
+    JsonlExporter(metrics, METRICS_JSONL).start()
+if METRICS_HTTP_PORT:
+    HttpExporter(metrics, METRICS_HTTP_PORT).start()
+
+# ================= CAR LINK =================
+# The link thread owns the socket and sends the 'V' ping itself; the car
+# pushes battery / RSSI / loop time on its own once it has heard from us.
+link = CarLink(ESP_IP, ESP_PORT, ping_interval=BATTERY_POLL_SEC, metrics=metrics)
+telemetry = TelemetrySeries()
+metrics.add_source("telemetry", lambda: telemetry.summary(60))
+
+def on_battery(data):
     global battery_level
-    while keep_running:
-        try:
-            sock.sendto(b'V', (ESP_IP, ESP_PORT))
-            data, _ = sock.recvfrom(BUFFER_SIZE)
-            battery_level = data.decode('utf-8')
-        except socket.timeout:
-            pass
-        except Exception as e:
-            print(f"Battery Error: {e}")
-        time.sleep(3)
-
-threading.Thread(target=fetch_battery, daemon=True).start()
-
-# ================= MEDIAPIPE SETUP =================
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.6)
-mp_draw = mp.solutions.drawing_utils
+    if telemetry.on_datagram(data):
+        battery_level = str(telemetry.latest().battery_pct)
+        return
+    battery_level = data.decode('utf-8', errors='ignore').strip().rstrip('%') or battery_level
 
-# ================= HELPER FUNCTIONS =================
-def count_fingers_ignore_thumb(lm_list):
-    """Counts only index, middle, ring, and pinky fingers (ignores thumb)."""
-    fingers = 0
-    for tip in [8, 12, 16, 20]:
-        if lm_list[tip][2] < lm_list[tip - 2][2]:
-            fingers += 1
-    return fingers
+link.subscribe(on_battery)
 
-def send_command(cmd):
-    try:
-        sock.sendto(cmd.encode(), (ESP_IP, ESP_PORT))
-    except Exception as e:
-        print(f"Send Error: {e}")
+probe = LatencyProbe(LATENCY_PROBE_IMAGE, expect="B", metrics=metrics) if LATENCY_PROBE else None
+if probe:
+    link.on_sent(probe.on_sent)
 
-# ================= MAIN LOOP =================
-cap = cv2.VideoCapture(0)
-cap.set(3, 640)
-cap.set(4, 480)
+# ================= HAND DETECTOR =================
+detector = make_detector(DETECTOR_BACKEND, roi=False, max_cost_ms=DETECTOR_MAX_MS)
 
-print("Starting Camera... Press 'q' to exit.")
+# ================= HELPER FUNCTIONS =================
+def send_command(cmd):
+    link.send(cmd)
 
-last_command = "S"
-last_send_time = 0
 
-while True:
-    success, img = cap.read()
-    if not success:
-        break
+def draw_overlay(img, det, fingers, status, color):
+    if det is not None:
+        draw_detection(img, det)
 
-    img = cv2.flip(img, 1)
-    results = hands.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-
-    command = "S"
-    color = (0, 0, 255)
-    status = "STOP"
-
-    if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
-            mp_draw.draw_landmarks(img, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-
-            h, w, _ = img.shape
-            lm_list = []
-            for id, lm in enumerate(hand_landmarks.landmark):
-                lm_list.append([id, int(lm.x * w), int(lm.y * h)])
-
-            if lm_list:
-                fingers = count_fingers_ignore_thumb(lm_list)
-
-                # === GESTURE LOGIC ===
-                if fingers == 1:
-                    command, status, color = "F", "FORWARD", (0, 255, 0)
-                elif fingers == 2:
-                    command, status, color = "B", "BACKWARD", (0, 165, 255)
-                elif fingers == 3:
-                    command, status, color = "L", "LEFT", (255, 255, 0)
-                elif fingers == 4:
-                    command, status, color = "R", "RIGHT", (255, 255, 0)
-                else:
-                    command, status, color = "S", "STOP", (0, 0, 255)
-
-                # Optional: show finger count
-                cv2.putText(img, f"Fingers (no thumb): {fingers}", (20, 420),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 2)
+        # Optional: show finger count
+        cv2.putText(img, f"Fingers (no thumb): {fingers}", (20, 420),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 200, 200), 2)
 
-    # Send command to car (with throttle)
-    if command != last_command or time.time() - last_send_time > 0.5:
-        send_command(command)
-        last_command = command
-        last_send_time = time.time()
+    cv2.putText(img, f"Suppressed: {gesture_filter.suppressed}  Detector: {detector.backend}", (20, 395),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
 
     # === CLEAN UI OVERLAY (no banner) ===
     # Battery (Top Left)
@@ -123,12 +128,154 @@ while True:
                 (15, 465),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.55, (200, 200, 200), 1)
 
-    cv2.imshow("Gesture Car (Clean UI)", img)
+    if SHOW_HUD:
+        draw_hud(img, metrics, origin=(470, 300))
+
+    if recorder:
+        rs = recorder.stats()
+        cv2.putText(img, f"REC q{rs['queue']} drop {rs['dropped']}", (15, 75),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+
+def command_stats():
+    return {"frames": dict(command_frames), "changes": gesture_filter.transitions,
+            "suppressed": gesture_filter.suppressed}
+
+
+def print_stats(window):
+    """One status line: rates over the last `window` seconds, command frame counts since the last line."""
+    global last_counts
+    diff = command_frames - last_counts
+    last_counts = command_frames.copy()
+    rtt = link.rtt_ms()
+    print(f"[stats] {metrics.rate('frame', window):5.1f} fps | infer {metrics.ms('inference'):5.1f} ms "
+          f"@ {metrics.rate('inference_run', window):4.1f} Hz | cmd {gesture_filter.command} "
+          + " ".join(f"{c}:{diff[c]}" for c in "FBLRS")
+          + f" | changes {gesture_filter.transitions} suppressed {gesture_filter.suppressed}"
+          f" | udp {metrics.rate('udp_send', window):4.1f}/s rtt {'--' if rtt is None else f'{rtt:.0f}'} ms"
+          f" loss {link.loss() * 100:.0f}% | battery {battery_level}%", flush=True)
+
+
+running = True
+
+def stop(signum, frame):
+    global running
+    running = False
+
+signal.signal(signal.SIGINT, stop)
+signal.signal(signal.SIGTERM, stop)
+
+# ================= MAIN LOOP =================
+cap = Camera(CAMERA_SOURCE, CAMERA_W, CAMERA_H, CAMERA_FPS, probe=probe)
+print(f"Camera: {cap.info()}")
+
+if HEADLESS:
+    print("Starting Camera (headless)... Ctrl+C or SIGTERM to stop.")
+else:
+    print("Starting Camera... Press 'q' to exit.")
+
+last_command = "S"
+last_send_time = 0
+gesture_filter = GestureFilter(GESTURE_WINDOW, GESTURE_VOTES, GESTURE_DWELL_SEC)
+session = SessionWriter(RECORD_SESSION, gesture_filter, SEND_THROTTLE_SEC) if RECORD_SESSION else None
+recorder = VideoRecorder(RECORD_VIDEO, RECORD_CODEC, CAMERA_FPS / RECORD_EVERY, RECORD_SIZE, RECORD_EVERY,
+                         RECORD_SEGMENT_SEC, metrics=metrics).start() if RECORD_VIDEO else None
+preview = MjpegPreview(PREVIEW_PORT, PREVIEW_FPS).start() if PREVIEW_PORT else None
+if preview:
+    print(f"Preview: http://127.0.0.1:{PREVIEW_PORT}/")
+scheduler = InferenceScheduler(budget_ms=FRAME_BUDGET_MS) if MOTION_GATING else None
+last_det, last_fingers = None, -1
+command_frames = Counter()   # frames sent per (filtered) command
+last_counts = Counter()
+metrics.add_source("commands", command_stats)
+t_start = last_stats = time.time()
+flipped = None
+
+while running:
+    with metrics.timer("capture"):
+        success, img = cap.read()
+    t_capture = time.time()
+    if not success:
+        break
+
+    img = flipped = cv2.flip(img, 1, dst=flipped if flipped is not None and flipped.shape == img.shape else None)
+
+    if scheduler and not scheduler.should_infer(img):
+        # Hand is still (or over budget): reuse the last detection and command
+        command, status, color = COMMAND_INFO[gesture_filter.command]
+    else:
+        metrics.mark("inference_run")
+        with metrics.timer("inference"):
+            det = detector.detect(img)
+
+        # === GESTURE LOGIC ===
+        fingers, command, confidence = decide(det)
+        last_det, last_fingers = det, fingers
+        if scheduler:
+            scheduler.set_hand(hand_points(det, img.shape))
+
+        # Debounce: only switch command after a confident N-of-M vote
+        raw_command = command
+        command, status, color = COMMAND_INFO[gesture_filter.update(command, confidence, now=t_capture)]
+        if session:
+            lm = det.landmarks if det else None
+            hand, hand_score = (det.hand, det.score) if det else (0, 0.0)
+            session.log(t_capture, lm, hand, hand_score, fingers, raw_command, command, confidence,
+                        parse_battery(battery_level), link.rtt_ms())
+
+    # Send command to car (with throttle)
+    if command != last_command or time.time() - last_send_time > SEND_THROTTLE_SEC:
+        send_command(command)
+        last_command = command
+        last_send_time = time.time()
+    command_frames[command] += 1
+
+    # Only pay for drawing when a frame is actually shown, recorded or previewed
+    want_preview = preview is not None and preview.due()
+    if not HEADLESS or recorder or want_preview:
+        with metrics.timer("draw"):
+            draw_overlay(img, last_det, last_fingers, status, color)
+        if recorder:
+            # Copy + enqueue only; encoding happens on the recorder thread
+            recorder.offer(img, {"command": command, "battery": parse_battery(battery_level),
+                                 "connected": link.connected(), "rtt_ms": link.rtt_ms()})
+        if want_preview:
+            preview.offer(img)
+
+    metrics.record("frame_age", time.time() - t_capture)
+    metrics.mark("frame")
+    if not HEADLESS:
+        with metrics.timer("paint"):
+            cv2.imshow("Gesture Car (Clean UI)", img)
+
+    if scheduler:
+        scheduler.frame_done(time.time() - t_capture)
+
+    if STATS_INTERVAL_SEC and t_capture - last_stats >= STATS_INTERVAL_SEC:
+        print_stats(min(STATS_INTERVAL_SEC, 2.0))
+        last_stats = t_capture
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        keep_running = False
+    if not HEADLESS and cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
+send_command("S")
 cap.release()
-cv2.destroyAllWindows()
-sock.close()
+if not HEADLESS:
+    cv2.destroyAllWindows()
+time.sleep(0.1)   # let the link thread flush the stop command
+link.close()
+detector.close()
+if preview:
+    preview.stop()
+elapsed = time.time() - t_start
+frames = sum(command_frames.values())
+print(f"Stopped after {elapsed:.0f} s: {frames} frames ({frames / max(elapsed, 1e-6):.1f} fps), "
+      f"commands {dict(command_frames)}, changes {gesture_filter.transitions}, "
+      f"suppressed {gesture_filter.suppressed}")
+if probe:
+    print(f"Glass-to-command latency: {probe.stats()}")
+if session:
+    session.close()
+if recorder:
+    recorder.close()
+    print(f"Recording: {recorder.stats()}")
@@ -1,26 +1,59 @@
-import sys, time, socket, threading, requests
-import cv2
-import mediapipe as mp
+import sys, time, threading, argparse
+from contextlib import contextmanager
+_T0 = time.perf_counter()
 
 from PyQt5.QtCore import QTimer, Qt, QByteArray, QRectF, QPointF
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QComboBox, QSlider
 )
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QLinearGradient, QColor, QTransform
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QLinearGradient, QColor, QTransform, QBrush
 from PyQt5.QtSvg import QSvgRenderer
+_T_QT = time.perf_counter()
+
+from pipeline import CapturePipeline
+from gesture_filter import GestureFilter
+from protocol import ControlEncoder
+
+# OpenCV, NumPy and the modules built on them are imported by load_runtime() on the
+# startup thread, so the window shows first. A spawned inference worker re-runs the
+# top level of this file as __mp_main__, so it does pay for the PyQt5 imports above;
+# it imports the detector stack itself.
+cv2 = None
+
+
+def load_runtime():
+    global cv2, make_detector, decide, draw_detection, hand_points, COMMAND_INFO
+    global SessionWriter, parse_battery, InferenceClient, InferenceScheduler
+    global FramePool, AllocSampler, crop_to_fit, Metrics, JsonlExporter, HttpExporter, draw_hud, CarLink
+    global Camera, LatencyProbe, VideoRecorder, TelemetrySeries
+    import cv2
+    from detectors import make_detector, decide, draw_detection, hand_points
+    from gesture import COMMAND_INFO
+    from session_log import SessionWriter, parse_battery
+    from inference_proc import InferenceClient
+    from scheduler import InferenceScheduler
+    from frames import FramePool, AllocSampler, crop_to_fit
+    from metrics import Metrics, JsonlExporter, HttpExporter, draw_hud
+    from carlink import CarLink
+    from capture import Camera, LatencyProbe
+    from recorder import VideoRecorder
+    from telemetry import TelemetrySeries
 
 ############################################################
 # CONFIG
 ############################################################
 ESP_IP = "192.168.4.1"        # ESP AP/server IP
 ESP_PORT = 8888               # UDP control port
-BUFFER_SIZE = 1024
 
 SEND_THROTTLE_SEC = 0.5
-BATTERY_POLL_SEC = 3
+BATTERY_POLL_SEC = 2          # 'V' ping: RTT/loss probe (battery comes from pushed telemetry)
+TELEMETRY_WINDOW_SEC = 60     # min/mean/max window for the metrics export
 CONNECTION_TIMEOUT_SEC = 6
 
+CAMERA_SOURCE = 0             # device index, video file or rtsp:// URL
+CAMERA_W, CAMERA_H = 1280, 720
+CAMERA_FPS = 30
 VIDEO_W, VIDEO_H = 800, 600
 ARENA_W, ARENA_H = 520, 260
 
@@ -30,41 +63,58 @@ SCROLL_SPEED_B = -5
 TILT_MAX_DEG = 30
 TILT_EASE = 0.15
 PARALLAX_EASE = 0.15
+SETTLE_EPS = 0.05             # easing counts as settled below this (px / deg)
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.settimeout(0.3)
+DETECTOR_BACKEND = "mediapipe"  # "mediapipe", "opencv" (skin/contour, low CPU) or "auto"
+DETECTOR_MAX_MS = 60          # "auto" falls back to OpenCV when MediaPipe costs more than this per frame
+ROI_INFERENCE = True          # track a crop around the last hand instead of the full frame
+INFERENCE_PROCESS = True      # run the detector in a worker process over shared memory
+MOTION_GATING = True          # skip inference while the hand region is still
+FRAME_BUDGET_MS = 40          # lower the inference rate when a frame costs more than this
+RESULT_TIMEOUT_SEC = 0.5      # worker silent this long (or 2 inference periods) -> STOP
 
-# MediaPipe
-mp_hands = mp.solutions.hands
-mp_draw = mp.solutions.drawing_utils
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.6)
+GESTURE_WINDOW = 5            # N-of-M vote: a new command needs GESTURE_VOTES of the last GESTURE_WINDOW frames
+GESTURE_VOTES = 3
+GESTURE_DWELL_SEC = 0.25      # minimum time a command is held before it can change
+
+RECORD_SESSION = None         # e.g. "drive.gcl": log landmarks + decisions (replay with session_log.py)
+RECORD_VIDEO = None           # e.g. "drives/run": annotated video + telemetry, in segments (recorder.py)
+RECORD_CODEC = "MJPG"
+RECORD_SIZE = None            # (w, h) to downscale recordings, None = as shown
+RECORD_EVERY = 2              # record every Nth rendered frame
+RECORD_SEGMENT_SEC = 300
+
+LATENCY_PROBE = False         # inject a probe hand every 3 s and show glass-to-command ms (the car WILL move)
+LATENCY_PROBE_IMAGE = None    # photo of a 2-finger hand; the built-in probe only fools the "opencv" detector
+
+SHOW_HUD = True               # FPS / inference / frame age / UDP rate overlay
+METRICS_JSONL = None          # e.g. "metrics.jsonl" to log a snapshot every second
+METRICS_HTTP_PORT = None      # e.g. 9100 to serve http://127.0.0.1:9100/metrics
+ALLOC_SAMPLE_SEC = 10         # tracemalloc 30 frames this often for the HUD "Alloc" figure, 0 = off
 
 
 ############################################################
-# Helpers
+# Startup profile
 ############################################################
-def count_fingers_ignore_thumb(lm_list):
-    fingers = 0
-    for tip in [8, 12, 16, 20]:
-        if lm_list[tip][2] < lm_list[tip - 2][2]:
-            fingers += 1
-    return fingers
-
-
-def crop_to_fit(frame, target_w, target_h):
-    """Crop camera feed to fill QLabel without black borders."""
-    h, w = frame.shape[:2]
-    src_aspect = w / h
-    dst_aspect = target_w / target_h
-    if src_aspect > dst_aspect:
-        new_w = int(h * dst_aspect)
-        x0 = (w - new_w) // 2
-        frame = frame[:, x0:x0 + new_w]
-    else:
-        new_h = int(w / dst_aspect)
-        y0 = (h - new_h) // 2
-        frame = frame[y0:y0 + new_h, :]
-    return cv2.resize(frame, (target_w, target_h), interpolation=cv2.INTER_AREA)
+class StartupProfile:
+    """Wall-clock startup phases, relative to the first line of this file."""
+    def __init__(self, t0=_T0, enabled=False):
+        self.t0=t0; self.enabled=enabled; self.phases=[]; self.lock=threading.Lock()
+
+    def add(self, name, start, end=None):
+        with self.lock:
+            self.phases.append((name, start, start if end is None else end, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name):
+        t=time.perf_counter()
+        try: yield
+        finally: self.add(name, t, time.perf_counter())
+
+    def report(self):
+        print(f"{'phase':<18}{'start ms':>10}{'end ms':>10}{'took ms':>10}  thread")
+        for name,a,b,th in sorted(self.phases,key=lambda p:p[1]):
+            print(f"{name:<18}{(a-self.t0)*1000:>10.1f}{(b-self.t0)*1000:>10.1f}{(b-a)*1000:>10.1f}  {th}")
 
 
 ############################################################
@@ -110,6 +160,12 @@ class RoadArena(QWidget):
         self.target_tilt = 0.0
         self.tilt = 0.0
 
+        # Pre-rendered background and car (per whole degree); cleared on resize
+        self._background = None
+        self._road_brush = None
+        self._car_cache = {}
+        self._dash_color = QColor("#e5e7eb")
+
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.tick)
         self.timer.start(ANIM_TICK_MS)
@@ -125,6 +181,8 @@ class RoadArena(QWidget):
         else:
             self.target_tilt = 0.0
             self.target_dx = 0.0
+        if not self.timer.isActive():
+            self.timer.start(ANIM_TICK_MS)
 
     def tick(self):
         if self.cmd == 'F':
@@ -134,36 +192,90 @@ class RoadArena(QWidget):
         self.scroll_y %= 60
         self.dx += (self.target_dx - self.dx) * PARALLAX_EASE
         self.tilt += (self.target_tilt - self.tilt) * TILT_EASE
+        if (self.cmd not in ('F', 'B') and abs(self.target_dx - self.dx) < SETTLE_EPS
+                and abs(self.target_tilt - self.tilt) < SETTLE_EPS):
+            # Nothing moves any more: snap, paint once more and let the timer sleep
+            # until the next set_command().
+            self.dx, self.tilt = self.target_dx, self.target_tilt
+            self.timer.stop()
         self.update()
 
+    def resizeEvent(self, e):
+        self._background = self._road_brush = None
+        self._car_cache.clear()
+        super().resizeEvent(e)
+
+    def _new_layer(self, w, h):
+        dpr = self.devicePixelRatioF()
+        pm = QPixmap(int(w * dpr), int(h * dpr))
+        pm.setDevicePixelRatio(dpr)
+        pm.fill(Qt.transparent)
+        return pm
+
+    def _background_layer(self):
+        """Sky/ground gradient; the only full-size pixmap kept around."""
+        if self._background is None:
+            w, h = self.width(), self.height()
+            pm = self._new_layer(w, h)
+            p = QPainter(pm)
+            grad = QLinearGradient(0, 0, 0, h)
+            grad.setColorAt(0.0, QColor("#0b1020"))
+            grad.setColorAt(1.0, QColor("#1e293b"))
+            p.fillRect(0, 0, w, h, grad)
+            p.end()
+            self._background = pm
+        return self._background
+
+    def _draw_road(self, p, w, h, dx):
+        """Perspective road for a parallax offset: one polygon, cheap enough per frame."""
+        top_y, bottom_y = int(h * 0.25), h
+        half_top, half_bottom = int(w * 0.12), int(w * 0.44)
+        if self._road_brush is None:
+            road_grad = QLinearGradient(0, top_y, 0, bottom_y)
+            road_grad.setColorAt(0.0, QColor("#1e293b"))
+            road_grad.setColorAt(1.0, QColor("#111827"))
+            self._road_brush = QBrush(road_grad)
+        p.setRenderHint(QPainter.Antialiasing)
+        p.setBrush(self._road_brush)
+        p.setPen(Qt.NoPen)
+        p.drawPolygon(
+            QPointF(w/2 - half_top + dx*0.2, top_y),
+            QPointF(w/2 + half_top + dx*0.2, top_y),
+            QPointF(w/2 + half_bottom + dx, bottom_y),
+            QPointF(w/2 - half_bottom + dx, bottom_y),
+        )
+        p.setRenderHint(QPainter.Antialiasing, False)
+
+    def _car_layer(self, tilt):
+        """Car SVG rendered once per whole-degree tilt, centred in a square pixmap."""
+        pm = self._car_cache.get(tilt)
+        if pm is not None:
+            return pm
+        cw, ch = self.car_size
+        side = int((cw * cw + ch * ch) ** 0.5) + 2   # fits the car at any rotation
+        pm = self._new_layer(side, side)
+        p = QPainter(pm)
+        p.setRenderHint(QPainter.Antialiasing)
+        tr = QTransform()
+        tr.translate(side/2, side/2)
+        tr.rotate(tilt)
+        tr.translate(-cw/2, -ch/2)
+        p.setTransform(tr)
+        self.car_svg.render(p, QRectF(0, 0, cw, ch))
+        p.end()
+        self._car_cache[tilt] = pm
+        return pm
+
     def paintEvent(self, e):
         p = QPainter(self)
-        p.setRenderHint(QPainter.Antialiasing)
         w, h = self.width(), self.height()
 
-        # Sky/ground gradient
-        grad = QLinearGradient(0, 0, 0, h)
-        grad.setColorAt(0.0, QColor("#0b1020"))
-        grad.setColorAt(1.0, QColor("#1e293b"))
-        p.fillRect(self.rect(), grad)
+        # Static background, then the road at the current parallax offset
+        p.drawPixmap(0, 0, self._background_layer())
+        self._draw_road(p, w, h, self.dx)
 
-        # Perspective road
+        # Lane dashes (the only per-frame geometry)
         top_y, bottom_y = int(h * 0.25), h
-        half_top, half_bottom = int(w * 0.12), int(w * 0.44)
-        road_grad = QLinearGradient(0, top_y, 0, bottom_y)
-        road_grad.setColorAt(0.0, QColor("#1e293b"))
-        road_grad.setColorAt(1.0, QColor("#111827"))
-        p.setBrush(road_grad)
-        p.setPen(Qt.NoPen)
-        road = [
-            QPointF(w/2 - half_top + self.dx*0.2, top_y),
-            QPointF(w/2 + half_top + self.dx*0.2, top_y),
-            QPointF(w/2 + half_bottom + self.dx, bottom_y),
-            QPointF(w/2 - half_bottom + self.dx, bottom_y),
-        ]
-        p.drawPolygon(*road)
-
-        # Lane dashes
         dash_gap = 60
         for i in range(-2, 12):
             y = top_y + i * dash_gap + self.scroll_y
@@ -172,19 +284,12 @@ class RoadArena(QWidget):
                 dash_w = 6 + 18 * t
                 dash_h = 14 + 24 * t
                 rect = QRectF(w/2 - dash_w/2 + self.dx*0.3, y, dash_w, dash_h)
-                p.fillRect(rect, QColor("#e5e7eb"))
+                p.fillRect(rect, self._dash_color)
 
         # Car (centered, tilting)
-        cw, ch = self.car_size
-        cx, cy = w/2, int(h*0.65)
-        p.save()
-        tr = QTransform()
-        tr.translate(cx, cy)
-        tr.rotate(self.tilt)
-        tr.translate(-cw/2, -ch/2)
-        p.setTransform(tr)
-        self.car_svg.render(p, QRectF(0, 0, cw, ch))
-        p.restore()
+        car = self._car_layer(int(round(self.tilt)))
+        side = car.width() / car.devicePixelRatio()
+        p.drawPixmap(QPointF(w/2 - side/2, int(h*0.65) - side/2), car)
 
 
 ############################################################
@@ -202,7 +307,7 @@ class ClickableSlider(QSlider):
 
 
 class SmartCarGUI(QWidget):
-    def __init__(self):
+    def __init__(self, profile=None):
         super().__init__()
         self.setWindowTitle("Smart Car Control")
         self.setGeometry(80, 40, 1360, 760)
@@ -273,30 +378,154 @@ class SmartCarGUI(QWidget):
         root=QHBoxLayout(); root.addLayout(left); root.addSpacing(12); root.addLayout(right); self.setLayout(root)
 
         # ---- State ----
-        self.cap=None
+        # Everything that needs OpenCV/NumPy, the camera or the model is filled in by the
+        # startup thread (boot) and on_runtime(); the window is up and "warming up" before that.
+        self.profile=profile or StartupProfile()
+        self.cap=None; self.pipeline=None; self.mode=self.mode_box.currentText()
+        self.detector=None; self.infer_proc=None; self.warm=False; self.backend=DETECTOR_BACKEND; self.probe=None
+        self.falling_back=False
+        self.last_result_seq=0; self.last_det=None
+        self.link=None; self.session=None; self.recorder=None; self.exporters=[]; self.alloc=None; self.alloc_txt="Alloc:--"
         self.timer=QTimer(self); self.timer.timeout.connect(self.tick_camera)
-        self.ui_timer=QTimer(self); self.ui_timer.timeout.connect(self.refresh_conn); self.ui_timer.start(500)
-        self.last_cmd='S'; self.last_send=0; self.last_rx=0; self.keep_threads=True; self.battery="N/A"
+        self.ui_timer=QTimer(self); self.ui_timer.timeout.connect(self.refresh_conn)
+        self.last_cmd='S'; self.last_send=0; self.battery="N/A"
+        self.encoder=ControlEncoder()
+        self.gesture_filter=GestureFilter(GESTURE_WINDOW,GESTURE_VOTES,GESTURE_DWELL_SEC)
         self.current_speed = self.speed_slider.value()
-
-        # Signals
-        self.mode_box.currentTextChanged.connect(self.on_mode)
-        self.speed_slider.valueChanged.connect(self.on_speed)
-        self.btn_f.clicked.connect(lambda:self.drive('F'))
-        self.btn_b.clicked.connect(lambda:self.drive('B'))
-        self.btn_l.clicked.connect(lambda:self.drive('L'))
-        self.btn_r.clicked.connect(lambda:self.drive('R'))
-        self.btn_s.clicked.connect(lambda:self.drive('S'))
-
-        threading.Thread(target=self.poll_battery,daemon=True).start()
-        self.start_camera()
-        self.on_mode(self.mode_box.currentText())
-        self.on_speed(self.current_speed)  # initialize speed on ESP via HTTP
+        self.video_label.setAlignment(Qt.AlignCenter); self.video_label.setText("Warming up...")
+
+        self.ready=set(); self.handled=set(); self.first_frame=False
+        self.boot_errors={}; self.shown_errors=set()   # phase -> message, written by the startup threads
+        self.closing=False; self.boot_lock=threading.Lock()
+        self.boot_timer=QTimer(self); self.boot_timer.timeout.connect(self.poll_boot); self.boot_timer.start(30)
+        threading.Thread(target=self.boot,name="startup",daemon=True).start()
+
+    # -------- Startup --------
+    def boot_failed(self,phase,e):
+        """Startup threads: remember why a phase failed; poll_boot shows it and skips the phase."""
+        print(f"Startup failed ({phase}): {type(e).__name__}: {e}")
+        self.boot_errors[phase]=f"{type(e).__name__}: {e}"
+
+    def boot(self):
+        """Startup thread: heavy imports, then camera open and model build + warm-up in parallel."""
+        try:
+            with self.profile.phase("runtime imports"): load_runtime()
+            self.probe=LatencyProbe(LATENCY_PROBE_IMAGE,expect="B") if LATENCY_PROBE else None
+        except Exception as e:
+            self.boot_failed("runtime",e); return
+        self.ready.add("runtime")
+        threading.Thread(target=self.open_camera,name="camera-open",daemon=True).start()
+        det=proc=None
+        try:
+            with self.profile.phase("model build"):
+                if INFERENCE_PROCESS:
+                    proc=InferenceClient(max_shape=(CAMERA_H,CAMERA_W,3),backend=DETECTOR_BACKEND,
+                                         roi=ROI_INFERENCE,max_cost_ms=DETECTOR_MAX_MS).start()
+                else:
+                    det=make_detector(DETECTOR_BACKEND,roi=ROI_INFERENCE,max_cost_ms=DETECTOR_MAX_MS)
+            with self.profile.phase("model warm-up"):
+                if proc and not proc.wait_ready():
+                    print("Inference worker did not become ready; running the detector in-process")
+                    proc.close(); proc=None
+                    det=make_detector(DETECTOR_BACKEND,roi=ROI_INFERENCE,max_cost_ms=DETECTOR_MAX_MS)
+                if det: det.warm_up((CAMERA_H,CAMERA_W,3))
+        except Exception as e:
+            if proc: proc.close()
+            if det: det.close()
+            self.boot_failed("model",e); return
+        with self.boot_lock:
+            if self.closing:
+                if proc: proc.close()
+                if det: det.close()
+                return
+            self.detector,self.infer_proc=det,proc
+            self.warm=True
+        self.ready.add("model")
+
+    def fall_back_in_process(self):
+        """The worker gave up restarting: build the detector here, in the background (STOP meanwhile)."""
+        if self.falling_back: return
+        self.falling_back=True; self.warm=False
+        print("Inference worker keeps crashing; running the detector in-process")
+        def build():
+            try:
+                det=make_detector(DETECTOR_BACKEND,roi=ROI_INFERENCE,max_cost_ms=DETECTOR_MAX_MS)
+                det.warm_up((CAMERA_H,CAMERA_W,3))
+            except Exception as e:
+                self.boot_failed("model",e); return   # gesture mode stays on STOP
+            with self.boot_lock:
+                if self.closing: det.close(); return
+                proc,self.infer_proc=self.infer_proc,None
+                self.detector=det; self.warm=True
+            proc.close()
+        threading.Thread(target=build,name="detector-fallback",daemon=True).start()
+
+    def open_camera(self):
+        try:
+            with self.profile.phase("camera open"):
+                cap=Camera(CAMERA_SOURCE,CAMERA_W,CAMERA_H,CAMERA_FPS,probe=self.probe)
+        except Exception as e:
+            self.boot_failed("camera",e); return
+        self.cap=cap
+        self.ready.add("camera")
+
+    def poll_boot(self):
+        """Qt thread: pick up whatever the startup threads have finished (or failed)."""
+        new=self.ready-self.handled
+        if "runtime" in new: self.on_runtime()
+        if "camera" in new: self.start_camera()
+        self.handled|=new
+        errors=dict(self.boot_errors)
+        if errors.keys()-self.shown_errors:
+            self.shown_errors|=errors.keys()
+            msg="\n".join(f"{p} failed: {m}" for p,m in errors.items())
+            # Visible until the first camera frame replaces it; a model failure also shows on every frame
+            self.video_label.setText("Startup failed\n"+msg); self.video_label.setWordWrap(True)
+            if "runtime" in errors: self.conn_label.setText("Startup failed (see camera panel)")
+        pending={"runtime","camera","model"}-self.handled-errors.keys()
+        if "runtime" in errors or (not pending and (self.first_frame or "camera" in errors)):
+            self.boot_timer.stop()
+            if self.profile.enabled: self.profile.report()
+
+    def on_runtime(self):
+        with self.profile.phase("runtime setup"):
+            self.pool=FramePool()
+            self.alloc=AllocSampler(every_sec=ALLOC_SAMPLE_SEC) if ALLOC_SAMPLE_SEC else None
+            self.scheduler=InferenceScheduler(budget_ms=FRAME_BUDGET_MS) if MOTION_GATING else None
+            self.metrics=Metrics()
+            if METRICS_JSONL: self.exporters.append(JsonlExporter(self.metrics,METRICS_JSONL).start())
+            if METRICS_HTTP_PORT: self.exporters.append(HttpExporter(self.metrics,METRICS_HTTP_PORT).start())
+            self.link=CarLink(ESP_IP,ESP_PORT,ping_interval=BATTERY_POLL_SEC,metrics=self.metrics)
+            self.telemetry=TelemetrySeries()
+            self.link.subscribe(self.on_telemetry)
+            self.metrics.add_source("telemetry",lambda:self.telemetry.summary(TELEMETRY_WINDOW_SEC))
+            if self.alloc:self.metrics.add_source("alloc",self.alloc.summary)
+            self.metrics.add_source("frame_pool",lambda:{"grown":self.pool.grown})
+            if self.probe:
+                self.probe.metrics=self.metrics
+                self.link.on_sent(self.probe.on_sent)
+            self.session=SessionWriter(RECORD_SESSION,self.gesture_filter,SEND_THROTTLE_SEC) if RECORD_SESSION else None
+            if RECORD_VIDEO:
+                self.recorder=VideoRecorder(RECORD_VIDEO,RECORD_CODEC,CAMERA_FPS/RECORD_EVERY,RECORD_SIZE,RECORD_EVERY,
+                                            RECORD_SEGMENT_SEC,metrics=self.metrics).start()
+
+            # Signals
+            self.mode_box.currentTextChanged.connect(self.on_mode)
+            self.speed_slider.valueChanged.connect(self.on_speed)
+            self.btn_f.clicked.connect(lambda:self.drive('F'))
+            self.btn_b.clicked.connect(lambda:self.drive('B'))
+            self.btn_l.clicked.connect(lambda:self.drive('L'))
+            self.btn_r.clicked.connect(lambda:self.drive('R'))
+            self.btn_s.clicked.connect(lambda:self.drive('S'))
+
+            self.on_mode(self.mode_box.currentText())
+            self.on_speed(self.current_speed)  # initialize speed on ESP (queued, never blocks)
+            self.ui_timer.start(500)
 
     # -------- Networking --------
-    def send_udp(self,txt):
-        try: sock.sendto(txt.encode(),(ESP_IP,ESP_PORT))
-        except: pass
+    def send_udp(self,cmd):
+        """Direction + current speed as one binary control datagram (protocol.py)."""
+        self.link.send(self.encoder.command(cmd))
 
     def throttle(self,cmd):
         t=time.time()
@@ -315,96 +544,180 @@ class SmartCarGUI(QWidget):
         self.current_speed = v
 
         mapped_speed = int(100 + (v / 255) * (255 - 100))
-        try:
-            # Use the same endpoint as the embedded webpage
-            requests.get(f"http://{ESP_IP}/setSpeed?value={mapped_speed}", timeout=0.5)
-        except Exception as e:
-            # Non-fatal; keep UI responsive
-            print("Speed update failed:", e)
+        # Speed-only control datagram: queued on the link, never blocks the UI
+        self.encoder.set_speed(mapped_speed)
+        self.link.send(self.encoder.speed_update())
 
-    def poll_battery(self):
-        while self.keep_threads:
-            try:
-                self.send_udp('V')
-                data,_=sock.recvfrom(BUFFER_SIZE)
-                rep=data.decode().strip()
-                if rep:
-                    self.last_rx=time.time()
-                    self.battery=rep.rstrip('%')
-            except socket.timeout:
-                pass
-            except Exception:
-                pass
-            time.sleep(BATTERY_POLL_SEC)
+    def on_telemetry(self,data):
+        """Runs on the link thread; appends to the series or swaps a string, never blocks."""
+        if self.telemetry.on_datagram(data):
+            self.battery=str(self.telemetry.latest().battery_pct); return
+        rep=data.decode(errors='ignore').strip()   # 'V' reply from older firmware
+        if rep: self.battery=rep.rstrip('%')
 
     def refresh_conn(self):
-        connected=(time.time()-self.last_rx)<CONNECTION_TIMEOUT_SEC
+        if self.alloc and self.alloc.growth_per_frame is not None:
+            peak="--" if self.alloc.peak_kb is None else f"{self.alloc.peak_kb:.0f}KB"
+            self.alloc_txt=f"Alloc:{peak} peak {self.alloc.growth_per_frame:+.0f}B/frame"
+        connected=self.link.connected(CONNECTION_TIMEOUT_SEC)
         self.conn_dot.setStyleSheet("background:#22C55E;border-radius:7px;" if connected else "background:#B00020;border-radius:7px;")
-        self.conn_label.setText("Connected" if connected else "Disconnected")
-        self.batt_label.setText(f"Battery:{self.battery}%")
+        if connected:
+            rtt=self.link.rtt_ms()
+            rtt="--" if rtt is None else f"{rtt:.0f}"
+            txt=f"Connected  RTT {rtt} ms  loss {self.link.loss()*100:.0f}%"
+            tel=self.telemetry.latest()
+            if tel is not None and self.telemetry.age()<CONNECTION_TIMEOUT_SEC:
+                if tel.rssi: txt+=f"  RSSI {tel.rssi} dBm"
+                loop=self.telemetry.window("loop_max_ms",10)
+                if loop: txt+=f"  car loop {loop[2]:.1f} ms"
+            self.conn_label.setText(txt)
+        else:
+            self.conn_label.setText("Disconnected")
+        volts=self.telemetry.window("battery_v",10)
+        self.batt_label.setText(f"Battery:{self.battery}%"+(f" ({volts[1]:.2f} V)" if volts else ""))
 
     def on_mode(self,mode):
+        self.mode=mode
+        self.gesture_filter.reset()
         man=(mode=="Manual Mode")
         for b in [self.btn_f,self.btn_b,self.btn_l,self.btn_r,self.btn_s]:
             b.setVisible(man)
 
     # -------- Camera + Overlay --------
     def start_camera(self):
-        if self.cap is None:
-            self.cap=cv2.VideoCapture(0)
-            self.cap.set(3,1280)
-            self.cap.set(4,720)
+        if self.pipeline is None:
+            self.pipeline=CapturePipeline(self.cap,self.infer,metrics=self.metrics,pool=self.pool,
+                                          release=lambda res:self.pool.release(res.payload[0]))
+        self.pipeline.start()
         if not self.timer.isActive(): self.timer.start(20)
 
-    def tick_camera(self):
-        ok,frame=self.cap.read()
-        if not ok: return
-        frame=cv2.flip(frame,1)
-
+    def infer(self,src):
+        """Inference stage (worker thread): flip, detect, classify, draw landmarks."""
+        t0=time.perf_counter()
+        frame=cv2.flip(src.image,1,dst=self.pool.get("flip",src.image.shape))
         cmd=None;text="STOP";color=(0,0,255)
-        if self.mode_box.currentText()=="Gesture Mode":
-            res=hands.process(cv2.cvtColor(frame,cv2.COLOR_BGR2RGB))
-            if res.multi_hand_landmarks:
-                for hnd in res.multi_hand_landmarks:
-                    mp_draw.draw_landmarks(frame,hnd,mp_hands.HAND_CONNECTIONS)
-                    h,w,_=frame.shape
-                    lm=[[i,int(l.x*w),int(l.y*h)] for i,l in enumerate(hnd.landmark)]
-                    if lm:
-                        f=count_fingers_ignore_thumb(lm)
-                        if f==1:cmd,text,color='F','FORWARD',(0,255,0)
-                        elif f==2:cmd,text,color='B','BACKWARD',(0,165,255)
-                        elif f==3:cmd,text,color='L','LEFT',(255,255,0)
-                        elif f==4:cmd,text,color='R','RIGHT',(255,255,0)
-                        else:cmd,text,color='S','STOP',(0,0,255)
-            else:cmd,text,color='S','STOP',(0,0,255)
+        if self.mode=="Gesture Mode" and not self.warm:
+            cmd="S";text="MODEL FAILED" if "model" in self.boot_errors else "WARMING UP";color=(0,200,255)
+        elif self.mode=="Gesture Mode":
+            cmd,text,color=self.detect(frame,src.t_capture)
+            # With the worker this thread only flips and submits; detect() feeds its inference time instead
+            if self.scheduler and not self.infer_proc:self.scheduler.frame_done(time.perf_counter()-t0)
+        return frame,cmd,text,color
+
+    def detect(self,frame,t_capture):
+        """Run (or skip) hand inference on a flipped frame and return the filtered command.
+
+        The filter and the session log both use the capture time, so a replay sees the same dwell."""
+        sched=self.scheduler
+        run=sched is None or sched.should_infer(frame)
+
+        if self.infer_proc and self.infer_proc.failed:
+            self.fall_back_in_process()
+            return 'S',"WARMING UP",(0,200,255)
+        if self.infer_proc:
+            # Hand the frame to the worker and use its newest result; never wait
+            if run:self.infer_proc.submit(frame)
+            r=self.infer_proc.latest()
+            if r is None or r.seq==self.last_result_seq:
+                if self.infer_proc.pending_sec()>max(RESULT_TIMEOUT_SEC,2*self.metrics.ms("inference")/1000.0):
+                    # Worker dead, hung or restarting: never keep driving on an old decision
+                    self.gesture_filter.reset(); self.last_det=None
+                    return 'S',"NO INFERENCE",(0,0,255)
+                # No new result: keep the current decision, don't re-vote
+                draw_detection(frame,self.last_det)
+                return COMMAND_INFO[self.gesture_filter.command]
+            self.last_result_seq=r.seq
+            self.metrics.mark("inference_run"); self.metrics.record("inference",r.infer_ms/1000.0)
+            if sched:sched.frame_done(r.infer_ms/1000.0)
+            det=r.detection; self.backend=r.backend
+        elif not run:
+            # Hand is still (or over budget): reuse the last detection and command
+            draw_detection(frame,self.last_det)
+            return COMMAND_INFO[self.gesture_filter.command]
         else:
+            self.metrics.mark("inference_run")
+            with self.metrics.timer("inference"):
+                det=self.detector.detect(frame)
+            self.backend=self.detector.backend
+        draw_detection(frame,det)
+        self.last_det=det
+        if sched:sched.set_hand(hand_points(det,frame.shape))
+        f,raw,conf=decide(det)
+        cmd=self.gesture_filter.update(raw,conf,now=t_capture)
+        if self.session:
+            lm=det.landmarks if det else None
+            hand,score=(det.hand,det.score) if det else (0,0.0)
+            self.session.log(t_capture,lm,hand,score,f,raw,cmd,conf,parse_battery(self.battery),self.link.rtt_ms())
+        return COMMAND_INFO[cmd]
+
+    def tick_camera(self):
+        """Render stage (Qt thread): only consumes finished pipeline results."""
+        res=self.pipeline.latest()
+        if res is None: return
+        if not self.first_frame:
+            self.first_frame=True; self.profile.add("first frame",time.perf_counter())
+        t0=time.perf_counter()
+        self.metrics.mark("frame"); self.metrics.record("frame_age",res.age)
+        frame,cmd,text,color=res.payload
+        flipped=frame   # pooled; handed back to the pool once painted
+
+        if self.mode!="Gesture Mode":
             cmd=self.last_cmd;text='Manual Control';color=(255,255,255)
         if cmd:self.throttle(cmd)
 
         # Draw overlays then crop-to-fit so they stay visible
-        frame=crop_to_fit(frame,VIDEO_W,VIDEO_H)
+        frame=crop_to_fit(frame,VIDEO_W,VIDEO_H,dst=self.pool.get("display",(VIDEO_H,VIDEO_W,3)))
         h,w=frame.shape[:2]; pad=20; line_h=30
-        cv2.putText(frame,f"Mode: {self.mode_box.currentText()}",(pad,line_h),cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,255,255),2)
+        cv2.putText(frame,f"Mode: {self.mode}",(pad,line_h),cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,255,255),2)
         cv2.putText(frame,f"Command: {text}",(pad,line_h*2),cv2.FONT_HERSHEY_SIMPLEX,0.8,color,2)
         cv2.putText(frame,f"Speed:{self.current_speed}",(pad,line_h*3),cv2.FONT_HERSHEY_SIMPLEX,0.7,(255,255,0),2)
         cv2.putText(frame,f"Battery:{self.battery}%",(pad,line_h*4),cv2.FONT_HERSHEY_SIMPLEX,0.7,(0,255,0),2)
-        rtxt="CONNECTED" if (time.time()-self.last_rx)<CONNECTION_TIMEOUT_SEC else "DISCONNECTED"
+        cv2.putText(frame,f"Detector:{self.backend}",(pad,line_h*5),cv2.FONT_HERSHEY_SIMPLEX,0.6,(200,200,200),1)
+        rtxt="CONNECTED" if self.link.connected(CONNECTION_TIMEOUT_SEC) else "DISCONNECTED"
         rcol=(0,255,0) if rtxt=="CONNECTED" else (0,0,255)
         tsize=cv2.getTextSize(rtxt,cv2.FONT_HERSHEY_DUPLEX,0.8,2)[0]
         cv2.putText(frame,rtxt,(w-tsize[0]-pad,line_h),cv2.FONT_HERSHEY_DUPLEX,0.8,rcol,2)
-
-        rgb=cv2.cvtColor(frame,cv2.COLOR_BGR2RGB)
-        qimg=QImage(rgb.data,w,h,w*3,QImage.Format_RGB888)
-        self.video_label.setPixmap(QPixmap.fromImage(qimg))
+        st=self.pipeline.stats()
+        cv2.putText(frame,f"Frames:{st['processed']} Dropped:{st['dropped_capture']+st['dropped_render']} Suppressed:{self.gesture_filter.suppressed} {self.alloc_txt}",(pad,h-pad),cv2.FONT_HERSHEY_SIMPLEX,0.5,(200,200,200),1)
+        if SHOW_HUD: draw_hud(frame,self.metrics)
+        if self.recorder:
+            rs=self.recorder.stats()
+            cv2.putText(frame,f"REC q{rs['queue']} drop {rs['dropped']}",(w-170,line_h*2),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,255),1)
+            # Copy + enqueue only; encoding happens on the recorder thread
+            self.recorder.offer(frame,{"mode":self.mode,"command":self.last_cmd,"speed":self.current_speed,
+                                       "battery":parse_battery(self.battery),"connected":rtxt=="CONNECTED",
+                                       "rtt_ms":self.link.rtt_ms(),"rssi":getattr(self.telemetry.latest(),"rssi",None)})
+
+        with self.metrics.timer("paint"):
+            # BGR buffer straight to Qt; fromImage makes the one unavoidable copy
+            qimg=QImage(frame.data,w,h,w*3,QImage.Format_BGR888)
+            self.video_label.setPixmap(QPixmap.fromImage(qimg))
+        self.pool.release(flipped); self.pool.release(frame)
+        if self.alloc:self.alloc.frame_done()
+        self.metrics.record("render",time.perf_counter()-t0)
 
     def closeEvent(self,e):
-        self.keep_threads=False
+        self.boot_timer.stop()
+        with self.boot_lock: self.closing=True
+        if self.pipeline:self.pipeline.stop()
+        for ex in self.exporters: ex.stop()
         if self.cap:self.cap.release()
+        if self.link:self.link.close()
+        if self.session:self.session.close()
+        if self.recorder:self.recorder.close()
+        if self.infer_proc:self.infer_proc.close()
+        if self.detector:self.detector.close()
         super().closeEvent(e)
 
 
 if __name__=="__main__":
-    app=QApplication(sys.argv)
-    g=SmartCarGUI()
-    g.show()
+    ap=argparse.ArgumentParser(description="Smart Car Control GUI")
+    ap.add_argument("--profile-startup",action="store_true",help="print startup phase timings after the first frame")
+    args,qt_args=ap.parse_known_args()
+    profile=StartupProfile(enabled=args.profile_startup)
+    profile.add("qt imports",_T0,_T_QT)
+    app=QApplication(sys.argv[:1]+qt_args)
+    with profile.phase("window"):
+        g=SmartCarGUI(profile)
+        g.show()
     sys.exit(app.exec_())
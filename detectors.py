@@ -0,0 +1,277 @@
+"""Pluggable hand-detector backends.
+
+Every backend takes a BGR frame and returns a Detection (or None when no
+hand is found), and keeps a ring buffer of its own per-frame cost:
+
+* MediaPipeDetector - the 21-landmark model, optionally behind the ROI tracker.
+* OpenCVDetector    - skin (HSV) segmentation, optionally AND-ed with a
+                      background-subtraction mask, then contour +
+                      convexity-defect finger counting. No landmarks, but
+                      cheap enough for Raspberry-Pi-class control stations.
+* AutoDetector      - MediaPipe until its measured cost goes over a
+                      threshold, then the OpenCV backend, probing
+                      MediaPipe again now and then.
+
+    detector = make_detector("auto", roi=True)
+    det = detector.detect(frame)
+"""
+import math
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from frames import draw_hand
+from gesture import command_for, count_fingers_ignore_thumb, finger_margin
+from metrics import RingBuffer
+
+# landmarks: (21, 3) normalized array or None; fingers: raised fingers (thumb ignored);
+# hand: 0 none / 1 left / 2 right; score: 0..1; outline: contour in pixels or None
+Detection = namedtuple("Detection", "landmarks fingers hand score outline")
+
+BACKENDS = ("mediapipe", "opencv")
+COST_WINDOW = 60   # frames averaged by cost_ms()
+
+
+class HandDetector:
+    name = "?"
+    stages = None   # seconds per sub-stage of the last frame, for backends that split it (bench.py)
+
+    def __init__(self):
+        self.cost = RingBuffer(COST_WINDOW)
+
+    @property
+    def backend(self):
+        """Name of the backend that handled the last frame."""
+        return self.name
+
+    def detect(self, frame):
+        t0 = time.perf_counter()
+        try:
+            return self._detect(frame)
+        finally:
+            self.cost.push(time.perf_counter() - t0)
+
+    def cost_ms(self):
+        return float(self.cost.values().mean()) * 1000.0 if len(self.cost) else 0.0
+
+    def warm_up(self, shape=(720, 1280, 3)):
+        """One untimed dummy frame, so model setup isn't paid (or measured) on the first real one."""
+        self._detect(np.zeros(shape, np.uint8))
+
+    def _detect(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def decide(det):
+    """(fingers, command, confidence) for a Detection (None = no hand -> stop)."""
+    if det is None:
+        return -1, "S", 1.0
+    if det.landmarks is not None:
+        return det.fingers, command_for(det.fingers)[0], det.score * finger_margin(det.landmarks)
+    return det.fingers, command_for(det.fingers)[0], det.score
+
+
+def hand_points(det, shape):
+    """Normalized (N, 2) points outlining the hand (for the scheduler), or None."""
+    if det is None:
+        return None
+    if det.landmarks is not None:
+        return det.landmarks[:, :2]
+    if det.outline is not None and len(det.outline):
+        h, w = shape[:2]
+        return det.outline.reshape(-1, 2) / np.array([w, h], np.float32)
+    return None
+
+
+def draw_detection(img, det, color=(0, 255, 0)):
+    if det is None:
+        return
+    if det.landmarks is not None:
+        draw_hand(img, det.landmarks)
+    elif det.outline is not None and len(det.outline):
+        cv2.drawContours(img, [det.outline.reshape(-1, 1, 2)], -1, color, 2)
+
+
+############################################################
+# MediaPipe
+############################################################
+class MediaPipeDetector(HandDetector):
+    name = "mediapipe"
+
+    def __init__(self, roi=True, **hands_kwargs):
+        super().__init__()
+        import mediapipe as mp   # only paid for when this backend is picked
+        from hand_roi import RoiHandTracker
+        from gesture import landmarks_to_array
+        self._to_array = landmarks_to_array
+        kw = dict(max_num_hands=1, min_detection_confidence=0.7, min_tracking_confidence=0.6)
+        kw.update(hands_kwargs)
+        self.hands = mp.solutions.hands.Hands(**kw)
+        self.model = RoiHandTracker(self.hands) if roi else self.hands
+        self._rgb = None
+
+    def _detect(self, frame):
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty_like(frame)
+        t0 = time.perf_counter()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        t1 = time.perf_counter()
+        res = self.model.process(rgb)
+        t2 = time.perf_counter()
+        self.stages = {"bgr2rgb": t1 - t0, "hands_process": t2 - t1}
+        if not res.multi_hand_landmarks:
+            return None
+        lm = self._to_array(res.multi_hand_landmarks[0])
+        hand, score = 2, 1.0
+        if res.multi_handedness:
+            c = res.multi_handedness[0].classification[0]
+            hand, score = (1 if c.label == "Left" else 2), c.score
+        det = Detection(lm, count_fingers_ignore_thumb(lm), hand, score, None)
+        self.stages["landmarks"] = time.perf_counter() - t2
+        return det
+
+    def close(self):
+        self.hands.close()
+
+
+############################################################
+# Pure OpenCV
+############################################################
+class OpenCVDetector(HandDetector):
+    name = "opencv"
+
+    def __init__(self, hsv_lo=(0, 40, 60), hsv_hi=(25, 255, 255), background=False,
+                 work_width=320, min_area=0.02, defect_depth=0.08, max_angle_deg=90,
+                 finger_reach=2.0):
+        super().__init__()
+        self.hsv_lo = np.array(hsv_lo, np.uint8)
+        self.hsv_hi = np.array(hsv_hi, np.uint8)
+        self.bg = cv2.createBackgroundSubtractorMOG2(history=300, detectShadows=False) if background else None
+        self.work_width = work_width           # segmentation runs on a frame this wide
+        self.min_area = min_area               # smallest hand blob, as a fraction of the frame
+        self.defect_depth = defect_depth       # valley depth between fingers, relative to blob height
+        self.max_cos = math.cos(math.radians(max_angle_deg))
+        self.finger_reach = finger_reach       # contour reach (in palm radii) that counts as one finger
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def _detect(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.work_width / w)
+        small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.hsv_lo, self.hsv_hi)
+        if self.bg is not None:
+            mask = cv2.bitwise_and(mask, self.bg.apply(small))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self._kernel)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+        cnt = max(contours, key=cv2.contourArea)
+        area = cv2.contourArea(cnt)
+        if area < self.min_area * mask.shape[0] * mask.shape[1]:
+            return None
+
+        fingers = self._count(cnt, mask)
+        hull_area = cv2.contourArea(cv2.convexHull(cnt))
+        # A clean open hand or fist is fairly solid; ragged blobs are usually background
+        score = float(min(1.0, area / hull_area + 0.2)) if hull_area else 0.0
+        outline = (cnt / scale).astype(np.int32)
+        return Detection(None, fingers, 0, score, outline)
+
+    def _count(self, cnt, mask):
+        hull = cv2.convexHull(cnt, returnPoints=False)
+        defects = None
+        if hull is not None and len(hull) >= 4:
+            try:
+                defects = cv2.convexityDefects(cnt, hull)
+            except cv2.error:   # self-intersecting hull on tiny blobs
+                pass
+        bx, by, bw, bh = cv2.boundingRect(cnt)
+        gaps = 0
+        for s, e, f, depth in (defects.reshape(-1, 4) if defects is not None else ()):   # (N,1,4) in 4.x, (N,4) in 5.x
+            if depth / 256.0 < self.defect_depth * bh:
+                continue
+            a, b, c = cnt[s][0], cnt[e][0], cnt[f][0]
+            v1, v2 = a - c, b - c
+            cos = float(np.dot(v1, v2)) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-6)
+            if cos > self.max_cos:   # angle at the valley below max_angle_deg
+                gaps += 1
+        # n gaps between raised fingers -> n + 1 fingers; the thumb can't be told apart
+        # here, so this only approximates the thumb-ignoring count of the landmark model.
+        if gaps:
+            return min(gaps + 1, 4)
+        # No gaps: a fist, or a single raised finger reaching well past the palm
+        dist = cv2.distanceTransform(mask[by:by + bh, bx:bx + bw], cv2.DIST_L2, 3)
+        _, radius, _, (cx, cy) = cv2.minMaxLoc(dist)
+        reach = np.hypot(cnt[:, 0, 0] - bx - cx, cnt[:, 0, 1] - by - cy).max()
+        return 1 if reach > self.finger_reach * radius else 0
+
+
+############################################################
+# Automatic switching
+############################################################
+class AutoDetector(HandDetector):
+    name = "auto"
+
+    def __init__(self, primary, fallback, max_cost_ms=60.0, probe_sec=30.0, min_samples=15):
+        super().__init__()
+        self.primary = primary
+        self.fallback = fallback
+        self.max_cost_ms = max_cost_ms
+        self.probe_sec = probe_sec
+        self.min_samples = min_samples
+        self.active = primary
+        self.switched_at = 0.0
+        self.switches = 0
+
+    @property
+    def backend(self):
+        return self.active.name
+
+    @property
+    def stages(self):
+        return self.active.stages
+
+    def _detect(self, frame):
+        now = time.time()
+        if self.active is self.fallback and now - self.switched_at > self.probe_sec:
+            # Give the primary another chance; its cost history restarts
+            self.primary.cost = RingBuffer(COST_WINDOW)
+            self._switch(self.primary, now)
+        det = self.active.detect(frame)
+        if (self.active is self.primary and len(self.primary.cost) >= self.min_samples
+                and self.primary.cost_ms() > self.max_cost_ms):
+            self._switch(self.fallback, now)
+        return det
+
+    def warm_up(self, shape=(720, 1280, 3)):
+        self.primary.warm_up(shape)
+        self.fallback.warm_up(shape)
+
+    def _switch(self, to, now):
+        self.active = to
+        self.switched_at = now
+        self.switches += 1
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+def make_detector(name="mediapipe", roi=True, max_cost_ms=60.0, hands_kwargs=None, opencv_kwargs=None):
+    """Build a backend by name: "mediapipe", "opencv" or "auto"."""
+    if name == "mediapipe":
+        return MediaPipeDetector(roi=roi, **(hands_kwargs or {}))
+    if name == "opencv":
+        return OpenCVDetector(**(opencv_kwargs or {}))
+    if name == "auto":
+        return AutoDetector(MediaPipeDetector(roi=roi, **(hands_kwargs or {})),
+                            OpenCVDetector(**(opencv_kwargs or {})), max_cost_ms)
+    raise ValueError(f"unknown detector backend {name!r} (choose mediapipe, opencv or auto)")
@@ -0,0 +1,319 @@
+"""Offline gesture-accuracy evaluation over a labelled dataset.
+
+The dataset is a directory tree whose first level is the expected label:
+a command letter (F/B/L/R/S), its name (forward, stop, ...) or a finger
+count (0-5). Anything below that is free-form and reported as a
+condition, so lighting, skin tone, angle or distance can be compared:
+
+    dataset/F/daylight/far/img_0001.jpg
+    dataset/2/lowlight/clip_03.mp4        # every --stride-th frame is a sample
+
+Files are spread over a process pool; each worker builds its own
+detector the first time it needs one. Detections (landmarks, finger count,
+score) are cached on disk, keyed by the file's SHA-1 and the backend, so
+reruns only classify: tuning gesture thresholds or --min-conf costs
+seconds. Prints a confusion matrix over F/B/L/R/S plus throughput:
+
+    python evaluate.py dataset --detector mediapipe --out mp.json
+    python evaluate.py dataset --detector opencv --out cv.json
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from detectors import BACKENDS, Detection, decide, make_detector
+from gesture import NUM_LANDMARKS, count_fingers_ignore_thumb
+
+COMMANDS = "FBLRS"
+REJECT = "?"        # prediction below --min-conf
+LABEL_NAMES = {"forward": "F", "backward": "B", "back": "B", "left": "L", "right": "R", "stop": "S"}
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+CACHE_VERSION = 1
+
+
+def parse_label(name):
+    """Directory name -> command letter, or None if it isn't a label."""
+    n = name.strip().lower()
+    if n.upper() in COMMANDS and len(n) == 1:
+        return n.upper()
+    if n.isdigit():
+        return decide(Detection(None, int(n), 0, 1.0, None))[1]
+    return LABEL_NAMES.get(n)
+
+
+def find_samples(root):
+    """[(path, label, condition)] for every image/video under a label directory."""
+    out = []
+    for label_dir in sorted(os.listdir(root)):
+        label = parse_label(label_dir)
+        if label is None or not os.path.isdir(os.path.join(root, label_dir)):
+            continue
+        for dirpath, _, files in os.walk(os.path.join(root, label_dir)):
+            rel = os.path.relpath(dirpath, os.path.join(root, label_dir))
+            condition = "" if rel == "." else rel.replace(os.sep, "/")
+            for f in sorted(files):
+                if f.lower().endswith(IMAGE_EXTS + VIDEO_EXTS):
+                    out.append((os.path.join(dirpath, f), label, condition))
+    return out
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+############################################################
+# Worker side
+############################################################
+_config = {}
+_detector = None
+
+
+def _init_worker(backend, stride, cache_dir):
+    _config.update(backend=backend, stride=stride, cache_dir=cache_dir)
+
+
+def _get_detector():
+    global _detector
+    if _detector is None:
+        # Every sample stands alone: no tracking between frames
+        _detector = make_detector(_config["backend"], roi=False,
+                                  hands_kwargs={"static_image_mode": True})
+    return _detector
+
+
+def _frames(path, stride):
+    if path.lower().endswith(IMAGE_EXTS):
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError("unreadable image")
+        yield 0, img
+        return
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("unreadable video")
+    i = 0
+    try:
+        while cap.grab():
+            if i % stride == 0:
+                ok, img = cap.retrieve()
+                if ok:
+                    yield i, img
+            i += 1
+    finally:
+        cap.release()
+
+
+def _detect_file(path, stride):
+    rows = []
+    detector = _get_detector()
+    for idx, img in _frames(path, stride):
+        t0 = time.perf_counter()
+        det = detector.detect(img)
+        rows.append((idx, det, time.perf_counter() - t0))
+    n = len(rows)
+    rec = {
+        "frame": np.array([r[0] for r in rows], np.int32),
+        "found": np.zeros(n, bool),
+        "landmarks": np.full((n, NUM_LANDMARKS, 3), np.nan, np.float32),
+        "fingers": np.full(n, -1, np.int8),
+        "hand": np.zeros(n, np.int8),
+        "score": np.zeros(n, np.float32),
+        "infer_ms": np.array([r[2] * 1000.0 for r in rows], np.float32),
+    }
+    for i, (_, det, _) in enumerate(rows):
+        if det is None:
+            continue
+        rec["found"][i] = True
+        if det.landmarks is not None:
+            rec["landmarks"][i] = det.landmarks
+        rec["fingers"][i], rec["hand"][i], rec["score"][i] = det.fingers, det.hand, det.score
+    return rec
+
+
+def _evaluate_file(path):
+    """(path, record, fresh, error) for one image or clip; runs in a pool worker."""
+    stride, cache_dir = _config["stride"], _config["cache_dir"]
+    try:
+        cache = None
+        if cache_dir:
+            stride_key = "" if path.lower().endswith(IMAGE_EXTS) else f"_s{stride}"
+            cache = os.path.join(cache_dir, f"{file_hash(path)}_{_config['backend']}_v{CACHE_VERSION}{stride_key}.npz")
+            if os.path.exists(cache):
+                with np.load(cache) as z:
+                    return path, {k: z[k] for k in z.files}, False, None
+        rec = _detect_file(path, stride)
+        if cache:
+            tmp = f"{cache}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **rec)
+            os.replace(tmp, cache)   # atomic: two workers may hash identical files
+        return path, rec, True, None
+    except Exception as e:
+        return path, None, False, f"{type(e).__name__}: {e}"
+
+
+############################################################
+# Scoring
+############################################################
+def classify(rec, min_conf=0.0):
+    """Predicted command per cached frame; finger counts are recomputed from landmarks."""
+    preds = []
+    for i in range(len(rec["frame"])):
+        det = None
+        if rec["found"][i]:
+            lm = rec["landmarks"][i]
+            if np.isnan(lm).any():
+                lm, fingers = None, int(rec["fingers"][i])
+            else:
+                fingers = count_fingers_ignore_thumb(lm)
+            det = Detection(lm, fingers, int(rec["hand"][i]), float(rec["score"][i]), None)
+        _, cmd, conf = decide(det)
+        preds.append(cmd if conf >= min_conf else REJECT)
+    return preds
+
+
+class Scorer:
+    def __init__(self):
+        self.cols = COMMANDS + REJECT
+        self.matrix = np.zeros((len(COMMANDS), len(self.cols)), np.int64)
+        self.conditions = defaultdict(lambda: [0, 0])   # condition -> [correct, scored]
+        self.mistakes = []
+
+    def add(self, path, label, condition, frames, preds):
+        r = COMMANDS.index(label)
+        for idx, p in zip(frames, preds):
+            self.matrix[r, self.cols.index(p)] += 1
+            if p == REJECT:
+                continue
+            c = self.conditions[condition or "(none)"]
+            c[0] += p == label
+            c[1] += 1
+            if p != label:
+                self.mistakes.append({"file": path, "frame": int(idx), "label": label, "predicted": p})
+
+    def report(self):
+        m = self.matrix[:, :len(COMMANDS)]
+        scored = int(m.sum())
+        total = int(self.matrix.sum())
+        per_class = {}
+        for i, c in enumerate(COMMANDS):
+            tp = int(m[i, i])
+            per_class[c] = {"support": int(self.matrix[i].sum()),
+                            "precision": round(tp / m[:, i].sum(), 4) if m[:, i].sum() else None,
+                            "recall": round(tp / m[i].sum(), 4) if m[i].sum() else None}
+        return {
+            "samples": total,
+            "accuracy": round(float(np.trace(m)) / scored, 4) if scored else None,
+            "coverage": round(scored / total, 4) if total else None,
+            "confusion": {c: dict(zip(self.cols, map(int, self.matrix[i]))) for i, c in enumerate(COMMANDS)},
+            "per_class": per_class,
+            "conditions": {k: {"accuracy": round(v[0] / v[1], 4), "samples": v[1]}
+                           for k, v in sorted(self.conditions.items()) if v[1]},
+        }
+
+
+def print_report(rep, throughput):
+    print(f"\nconfusion (rows = label, cols = predicted; {REJECT} = below --min-conf)")
+    cols = COMMANDS + REJECT
+    print("      " + "".join(f"{c:>7}" for c in cols) + f"{'recall':>9}")
+    for c in COMMANDS:
+        row = rep["confusion"][c]
+        rec = rep["per_class"][c]["recall"]
+        print(f"{c:<6}" + "".join(f"{row[k]:>7}" for k in cols) + f"{'--' if rec is None else f'{rec:.3f}':>9}")
+    prec = [rep["per_class"][c]["precision"] for c in COMMANDS]
+    print(f"{'prec':<6}" + "".join(f"{'--' if p is None else f'{p:.3f}':>7}" for p in prec))
+    acc = rep["accuracy"]
+    print(f"\naccuracy {'--' if acc is None else f'{acc:.3f}'}  coverage {rep['coverage'] or 0:.3f}  "
+          f"samples {rep['samples']}")
+    if len(rep["conditions"]) > 1:
+        print("\nby condition")
+        for k, v in rep["conditions"].items():
+            print(f"  {k:<30}{v['accuracy']:>7.3f}{v['samples']:>8}")
+    t = throughput
+    print(f"\n{t['files']} files, {t['frames']} frames in {t['wall_s']:.1f} s "
+          f"({t['frames_per_s']:.1f} frames/s, {t['workers']} workers); "
+          f"inferred {t['inferred_frames']} ({t['infer_ms']:.1f} ms/frame), cached {t['cached_frames']}, "
+          f"errors {t['errors']}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Gesture accuracy over a labelled image/video directory")
+    ap.add_argument("dataset", help="directory with one sub-directory per label (F/B/L/R/S, names or 0-5)")
+    ap.add_argument("--detector", default="mediapipe", choices=BACKENDS)
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    ap.add_argument("--stride", type=int, default=5, help="use every Nth frame of a video")
+    ap.add_argument("--min-conf", type=float, default=0.0,
+                    help="count predictions below this confidence as rejected (cf. GestureFilter)")
+    ap.add_argument("--cache", default=".evalcache", help="detection cache directory")
+    ap.add_argument("--no-cache", action="store_true", help="always run the detector")
+    ap.add_argument("--out", help="also write the report (with every misclassified frame) as JSON")
+    args = ap.parse_args(argv)
+
+    samples = find_samples(args.dataset)
+    if not samples:
+        raise SystemExit(f"no labelled images or videos under {args.dataset!r}")
+    labels = {path: (label, cond) for path, label, cond in samples}
+    cache_dir = None if args.no_cache else args.cache
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    workers = max(1, min(len(samples), args.workers or os.cpu_count() or 1))
+    print(f"{len(samples)} files, {args.detector} detector, {workers} workers")
+
+    scorer = Scorer()
+    stats = defaultdict(float)
+    errors = []
+    t0 = time.perf_counter()
+    # spawn, like inference_proc: model libraries don't survive a fork well
+    with mp.get_context("spawn").Pool(workers, _init_worker, (args.detector, args.stride, cache_dir)) as pool:
+        for done, (path, rec, fresh, err) in enumerate(
+                pool.imap_unordered(_evaluate_file, [s[0] for s in samples], chunksize=4), 1):
+            if err:
+                errors.append({"file": path, "error": err})
+                continue
+            n = len(rec["frame"])
+            stats["frames"] += n
+            if fresh:
+                stats["inferred_frames"] += n
+                stats["infer_s"] += float(rec["infer_ms"].sum()) / 1000.0
+            else:
+                stats["cached_frames"] += n
+            label, cond = labels[path]
+            scorer.add(path, label, cond, rec["frame"], classify(rec, args.min_conf))
+            if done % 100 == 0:
+                print(f"  {done}/{len(samples)} files", flush=True)
+    wall = time.perf_counter() - t0
+
+    rep = scorer.report()
+    throughput = {
+        "files": len(samples), "workers": workers, "wall_s": round(wall, 2),
+        "frames": int(stats["frames"]), "frames_per_s": round(stats["frames"] / wall, 1) if wall else 0.0,
+        "inferred_frames": int(stats["inferred_frames"]), "cached_frames": int(stats["cached_frames"]),
+        "infer_ms": round(stats["infer_s"] * 1000.0 / stats["inferred_frames"], 2) if stats["inferred_frames"] else 0.0,
+        "errors": len(errors),
+    }
+    print_report(rep, throughput)
+    for e in errors[:10]:
+        print(f"  error: {e['file']}: {e['error']}")
+
+    if args.out:
+        rep.update(detector=args.detector, stride=args.stride, min_conf=args.min_conf,
+                   throughput=throughput, errors=errors, mistakes=scorer.mistakes)
+        with open(args.out, "w") as f:
+            json.dump(rep, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Fleet mode: one controller process driving several cameras and cars.
+
+    python fleet.py --car 0=192.168.4.1 --car 1=192.168.5.1 --car demo.mp4=10.0.0.7:8888
+
+Each --car pairs a camera source (device index, video file or stream URL)
+with a car address. Per car, a capture thread flips each frame into a
+shared-memory inference lane and turns the newest result into a
+debounced, throttled command. Lanes are spread round-robin over a pool
+of worker processes (one per core by default), each lane with its own
+detector, so inference scales with cores instead of fighting over one
+GIL. All car links share one LinkLoop thread. The dashboard tiles every
+camera with its FPS, inference time, glass-to-command latency, RTT and
+the battery / RSSI each car pushes.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from capture import Camera
+from carlink import ESP_PORT, CarLink, LinkLoop
+from detectors import decide, draw_detection, make_detector
+from gesture import COMMAND_INFO
+from gesture_filter import GestureFilter
+from inference_proc import InferenceClient
+from metrics import Metrics
+from protocol import ControlEncoder
+from session_log import parse_battery
+from telemetry import TelemetrySeries
+
+SEND_THROTTLE_SEC = 0.5
+BATTERY_POLL_SEC = 2          # RTT/loss probe; battery comes from pushed telemetry
+CONNECTION_TIMEOUT_SEC = 6
+RESULT_TIMEOUT_SEC = 0.5      # worker silent this long (or 2 inference periods) -> STOP
+TILE_W, TILE_H = 480, 270
+DASHBOARD_HZ = 10
+
+CarSpec = namedtuple("CarSpec", "name source host port")
+
+
+def parse_car(text):
+    """"SOURCE=HOST[:PORT]" -> CarSpec; a numeric SOURCE is a camera index."""
+    source, sep, addr = text.rpartition("=")
+    if not sep or not source or not addr:
+        raise argparse.ArgumentTypeError(f"expected SOURCE=HOST[:PORT], got {text!r}")
+    host, _, port = addr.partition(":")
+    return CarSpec(addr, int(source) if source.isdigit() else source, host,
+                   int(port) if port else ESP_PORT)
+
+
+############################################################
+# One camera + one car
+############################################################
+class FleetCar:
+    def __init__(self, spec, client, lane, loop, width=640, height=480, speed=180):
+        self.spec = spec
+        self.client = client
+        self.lane = lane
+        self.size = (width, height)
+        self.metrics = Metrics()
+        self.link = CarLink(spec.host, spec.port, loop=loop, ping_interval=BATTERY_POLL_SEC,
+                            metrics=self.metrics)
+        self.telemetry = TelemetrySeries()
+        self.metrics.add_source("telemetry", lambda: self.telemetry.summary(60))
+        self.link.subscribe(self._on_telemetry)
+        self.encoder = ControlEncoder(speed)
+        self.gesture_filter = GestureFilter()
+        self.battery = None
+        self.det = None
+        self.detector = None           # in-process fallback once the worker gives up
+        self.thumb = np.zeros((TILE_H, TILE_W, 3), np.uint8)
+        self.ended = False
+
+        self.cap = Camera(spec.source, width, height)
+        self._flip = np.empty((height, width, 3), np.uint8)
+        self._t_submit = np.zeros(64)       # capture time per submitted seq (mod 64)
+        self._last_seq = 0
+        self._last_cmd = "S"
+        self._last_send = 0.0
+        self._last_thumb = 0.0
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name=f"car-{spec.name}", daemon=True)
+
+    def start(self):
+        self._running = True
+        self.link.send(self.encoder.speed_update())
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._thread.join(2.0)
+        self.link.send(self.encoder.command("S"))
+        self.cap.release()
+        if self.detector is not None:
+            self.detector.close()
+
+    def _on_telemetry(self, data):
+        if self.telemetry.on_datagram(data):
+            self.battery = self.telemetry.latest().battery_pct
+        else:   # 'V' reply from firmware without the telemetry push
+            self.battery = parse_battery(data.decode(errors="ignore").strip().rstrip("%"))
+
+    def _run(self):
+        w, h = self.size
+        while self._running:
+            with self.metrics.timer("capture"):
+                ok, frame = self.cap.read()
+            if not ok:
+                self.ended = True     # camera gone or end of file: stop this car
+                self._send("S")
+                break
+            t_capture = time.time()
+            if frame.shape[:2] != (h, w):
+                frame = cv2.resize(frame, (w, h))
+            frame = cv2.flip(frame, 1, dst=self._flip)
+
+            if self.client.failed:
+                self._detect_local(frame, t_capture)
+                continue
+
+            seq = self.client.submit(frame, self.lane)
+            if seq is not None:
+                self._t_submit[seq % len(self._t_submit)] = t_capture
+            r = self.client.latest(self.lane)
+            if r is not None and r.seq != self._last_seq:
+                self._last_seq = r.seq
+                self.metrics.mark("inference_run")
+                self.metrics.record("inference", r.infer_ms / 1000.0)
+                self._decide(r.detection)
+                # Glass to command: capture of the frame behind this decision -> datagram queued
+                self.metrics.record("latency", time.time() - self._t_submit[r.seq % len(self._t_submit)])
+            elif self.client.pending_sec(self.lane) > max(RESULT_TIMEOUT_SEC, 2 * self.metrics.ms("inference") / 1000.0):
+                # Worker dead, hung or restarting: stop instead of repeating the last command
+                self.gesture_filter.reset()
+                self.det = None
+                self._send("S")
+            else:
+                self._send(self.gesture_filter.command)
+            self._frame_done(frame, t_capture)
+
+    def _detect_local(self, frame, t_capture):
+        if self.detector is None:
+            print(f"{self.spec.name}: inference worker gave up; running the detector in this thread")
+            self.detector = make_detector(self.client.backend, roi=self.client.roi,
+                                          max_cost_ms=self.client.max_cost_ms,
+                                          hands_kwargs=self.client.hands_kwargs)
+        with self.metrics.timer("inference"):
+            det = self.detector.detect(frame)
+        self.metrics.mark("inference_run")
+        self._decide(det)
+        self.metrics.record("latency", time.time() - t_capture)
+        self._frame_done(frame, t_capture)
+
+    def _decide(self, det):
+        self.det = det
+        _, raw, conf = decide(det)
+        self.gesture_filter.update(raw, conf)
+        self._send(self.gesture_filter.command)
+
+    def _frame_done(self, frame, t_capture):
+        self.metrics.mark("frame")
+        if t_capture - self._last_thumb >= 1.0 / DASHBOARD_HZ:
+            self._last_thumb = t_capture
+            draw_detection(frame, self.det)
+            self.thumb = cv2.resize(frame, (TILE_W, TILE_H), interpolation=cv2.INTER_AREA)
+
+    def _send(self, cmd):
+        now = time.time()
+        if cmd != self._last_cmd or now - self._last_send > SEND_THROTTLE_SEC:
+            self.link.send(self.encoder.command(cmd))
+            self._last_cmd, self._last_send = cmd, now
+
+    def status(self):
+        rtt = self.link.rtt_ms()
+        tel = self.telemetry.latest()
+        return {
+            "car": self.spec.name,
+            "command": self.gesture_filter.command,
+            "fps": self.metrics.rate("frame"),
+            "infer_ms": self.metrics.ms("inference"),
+            "infer_hz": self.metrics.rate("inference_run"),
+            "latency_ms": self.metrics.ms("latency"),
+            "rtt_ms": rtt,
+            "loss": self.link.loss(),
+            "battery": self.battery,
+            "rssi": tel.rssi if tel is not None and tel.rssi else None,
+            "connected": self.link.connected(CONNECTION_TIMEOUT_SEC),
+            "ended": self.ended,
+        }
+
+
+############################################################
+# Fleet
+############################################################
+class Fleet:
+    def __init__(self, specs, workers=None, backend="mediapipe", roi=True, width=640, height=480,
+                 speed=180, max_cost_ms=60.0):
+        self.workers = max(1, min(len(specs), workers or os.cpu_count() or 1))
+        lanes = [len(specs[i::self.workers]) for i in range(self.workers)]
+        self.clients = [InferenceClient(max_shape=(height, width, 3), backend=backend, roi=roi, lanes=n,
+                                        max_cost_ms=max_cost_ms)
+                        for n in lanes]
+        self.loop = LinkLoop().start()
+        # Car i -> worker i % workers, lane i // workers
+        self.cars = [FleetCar(spec, self.clients[i % self.workers], i // self.workers, self.loop,
+                              width, height, speed)
+                     for i, spec in enumerate(specs)]
+
+    def start(self, ready_timeout=60.0):
+        for client in self.clients:
+            client.start()
+        for client in self.clients:
+            if not client.wait_ready(ready_timeout):
+                print("An inference worker did not become ready; its cars run the detector in-process")
+                client.abandon()
+        for car in self.cars:
+            car.start()
+        return self
+
+    def stop(self):
+        for car in self.cars:
+            car.stop()
+        for client in self.clients:
+            client.close()
+        time.sleep(0.1)   # let the loop flush the final stop datagrams
+        for car in self.cars:
+            car.link.close()
+        self.loop.stop()
+
+    @property
+    def done(self):
+        return all(car.ended for car in self.cars)
+
+
+############################################################
+# Dashboard
+############################################################
+def _fmt(v, spec, unknown="--"):
+    return unknown if v is None else format(v, spec)
+
+
+def draw_dashboard(cars, cols):
+    rows = -(-len(cars) // cols)
+    board = np.zeros((rows * TILE_H, cols * TILE_W, 3), np.uint8)
+    for i, car in enumerate(cars):
+        st = car.status()
+        tile = car.thumb.copy()
+        _, label, color = COMMAND_INFO[st["command"]]
+        lines = [
+            (f"{st['car']}  {label}", color),
+            (f"FPS {st['fps']:4.1f}  infer {st['infer_ms']:5.1f} ms @ {st['infer_hz']:4.1f} Hz", (0, 255, 255)),
+            (f"glass->cmd {st['latency_ms']:5.1f} ms  RTT {_fmt(st['rtt_ms'], '.0f')} ms", (0, 255, 255)),
+            (f"battery {_fmt(st['battery'], '.0f')}%  RSSI {_fmt(st['rssi'], 'd')}  "
+             + ("ENDED" if st["ended"] else "CONNECTED" if st["connected"] else "DISCONNECTED"),
+             (0, 255, 0) if st["connected"] else (0, 0, 255)),
+        ]
+        for j, (txt, col) in enumerate(lines):
+            cv2.putText(tile, txt, (10, 24 + 22 * j), cv2.FONT_HERSHEY_SIMPLEX, 0.55, col, 1)
+        r, c = divmod(i, cols)
+        board[r * TILE_H:(r + 1) * TILE_H, c * TILE_W:(c + 1) * TILE_W] = tile
+    return board
+
+
+def print_table(cars):
+    print(f"{'car':<22}{'cmd':>4}{'fps':>7}{'infer ms':>10}{'cmd ms':>8}{'rtt ms':>8}{'batt':>6}{'rssi':>6}")
+    for car in cars:
+        st = car.status()
+        print(f"{st['car']:<22}{st['command']:>4}{st['fps']:>7.1f}{st['infer_ms']:>10.1f}"
+              f"{st['latency_ms']:>8.1f}{_fmt(st['rtt_ms'], '.0f'):>8}{_fmt(st['battery'], '.0f'):>6}"
+              f"{_fmt(st['rssi'], 'd'):>6}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Drive several gesture-controlled cars from one process")
+    ap.add_argument("--car", action="append", type=parse_car, required=True, metavar="SOURCE=HOST[:PORT]",
+                    help="camera source and car address (repeatable)")
+    ap.add_argument("--workers", type=int, default=None, help="inference processes (default: one per core)")
+    ap.add_argument("--detector", default="mediapipe", choices=("mediapipe", "opencv", "auto"))
+    ap.add_argument("--no-roi", action="store_true", help="run the hand model on the full frame")
+    ap.add_argument("--max-ms", type=float, default=60.0,
+                    help="'auto' falls back to OpenCV when MediaPipe costs more than this per frame")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--speed", type=int, default=180, help="PWM sent to every car (100-255)")
+    ap.add_argument("--no-window", action="store_true", help="print a status table instead of the dashboard")
+    args = ap.parse_args(argv)
+
+    fleet = Fleet(args.car, args.workers, args.detector, not args.no_roi, args.width, args.height,
+                  args.speed, args.max_ms)
+    print(f"{len(fleet.cars)} cars on {fleet.workers} inference workers; warming up...")
+    fleet.start()
+    cols = max(1, min(len(fleet.cars), 3))
+    try:
+        while not fleet.done:
+            if args.no_window:
+                time.sleep(2.0)
+                print_table(fleet.cars)
+            else:
+                cv2.imshow("Fleet", draw_dashboard(fleet.cars, cols))
+                if cv2.waitKey(1000 // DASHBOARD_HZ) & 0xFF == ord("q"):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fleet.stop()
+        if not args.no_window:
+            cv2.destroyAllWindows()
+        print_table(fleet.cars)
+
+
+if __name__ == "__main__":
+    main()
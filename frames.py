@@ -0,0 +1,138 @@
+"""Frame helpers shared by the GUI, the benchmark and the tools."""
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from gesture import HAND_CONNECTIONS
+
+
+class FramePool:
+    """Named rings of preallocated frame buffers, each with a single owner.
+
+    Each stage writes into a buffer from its own ring through OpenCV's
+    `dst=` arguments instead of allocating a new array per frame. get()
+    checks a free buffer out and the last stage that reads it hands it back
+    with release(); a checked-out buffer is never handed out again, so a
+    producer that outpaces its consumer (and has its results dropped)
+    cannot overwrite a frame that is still being read. Whoever drops a
+    frame releases it too (CapturePipeline does this for its queues). When
+    every buffer of a ring is out the ring grows by one and `grown` counts
+    it, so a missing release() costs memory, never a torn frame. The GUI
+    pipeline keeps at most 3 of a kind out (written, queued, being read).
+    """
+
+    def __init__(self, depth=4):
+        self.depth = depth
+        self._rings = {}
+        self._out = set()     # id() of checked-out buffers
+        self._lock = threading.Lock()
+        self.grown = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        with self._lock:
+            ring = self._rings.get(name)
+            if ring is None or ring[0].shape != tuple(shape) or ring[0].dtype != dtype:
+                ring = self._rings[name] = [np.empty(shape, dtype) for _ in range(self.depth)]
+            for buf in ring:
+                if id(buf) not in self._out:
+                    break
+            else:
+                buf = np.empty(shape, dtype)
+                ring.append(buf)
+                self.grown += 1
+            self._out.add(id(buf))
+            return buf
+
+    def release(self, buf):
+        """Hand a buffer from get() back; anything else (or None) is ignored."""
+        with self._lock:
+            self._out.discard(id(buf))
+
+
+class AllocSampler:
+    """Python/numpy allocation during rendered frames, measured with tracemalloc.
+
+    Tracing slows every allocation down, so it is only switched on for
+    `frames` frames every `every_sec` seconds. Each window reports the peak
+    traced memory above its start (what the frames allocated and freed
+    again) and the net growth per frame (what they kept). tracemalloc sees
+    all threads, so capture and link work during the window is included;
+    OpenCV's internal scratch memory is not.
+    """
+
+    def __init__(self, frames=30, every_sec=10.0):
+        self.frames = frames
+        self.every = every_sec
+        self.peak_kb = None              # last window; None before the first one
+        self.growth_per_frame = None     # bytes
+        self._counted = None             # frames in the current window, None when not tracing
+        self._owned = False              # we started tracemalloc (not PYTHONTRACEMALLOC)
+        self._peak_ok = False
+        self._base = 0
+        self._next = time.monotonic() + every_sec   # skip startup allocations
+
+    def frame_done(self):
+        now = time.monotonic()
+        if self._counted is None:
+            if now >= self._next:
+                self._begin()
+            return
+        self._counted += 1
+        if self._counted < self.frames:
+            return
+        cur, peak = tracemalloc.get_traced_memory()
+        self.peak_kb = (peak - self._base) / 1024 if self._peak_ok else None
+        self.growth_per_frame = (cur - self._base) / self._counted
+        if self._owned:
+            tracemalloc.stop()
+        self._counted = None
+        self._next = now + self.every
+
+    def _begin(self):
+        self._owned = not tracemalloc.is_tracing()
+        if self._owned:
+            tracemalloc.start()
+        reset_peak = getattr(tracemalloc, "reset_peak", None)   # Python 3.9+
+        if reset_peak is not None:
+            reset_peak()
+        self._peak_ok = self._owned or reset_peak is not None
+        self._base = tracemalloc.get_traced_memory()[0]
+        self._counted = 0
+
+    def summary(self):
+        return {"sampling": self._counted is not None,
+                "peak_kb": None if self.peak_kb is None else round(self.peak_kb, 1),
+                "growth_b_per_frame": None if self.growth_per_frame is None else round(self.growth_per_frame)}
+
+
+def crop_to_fit(frame, target_w, target_h, dst=None):
+    """Crop camera feed to fill QLabel without black borders.
+
+    The crop is a view; with `dst` the resize writes into that buffer.
+    """
+    h, w = frame.shape[:2]
+    src_aspect = w / h
+    dst_aspect = target_w / target_h
+    if src_aspect > dst_aspect:
+        new_w = int(h * dst_aspect)
+        x0 = (w - new_w) // 2
+        frame = frame[:, x0:x0 + new_w]
+    else:
+        new_h = int(w / dst_aspect)
+        y0 = (h - new_h) // 2
+        frame = frame[y0:y0 + new_h, :]
+    return cv2.resize(frame, (target_w, target_h), dst=dst, interpolation=cv2.INTER_AREA)
+
+
+def draw_hand(img, landmarks, line_color=(224, 224, 224), point_color=(0, 0, 255)):
+    """draw_landmarks look-alike for a (21, 3) normalized landmark array."""
+    h, w = img.shape[:2]
+    pts = (np.asarray(landmarks)[:, :2] * (w, h)).astype(np.int32)
+    for a, b in HAND_CONNECTIONS:
+        cv2.line(img, tuple(pts[a]), tuple(pts[b]), line_color, 2)
+    for x, y in pts:
+        cv2.circle(img, (int(x), int(y)), 4, point_color, -1)
+    return img
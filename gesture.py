@@ -0,0 +1,77 @@
+"""Gesture engine shared by cv.py and cv_gui.py.
+
+Landmarks are kept as a (21, 3) float32 array of MediaPipe's normalized
+x, y, z. The finger counter compares the y of each fingertip against the
+PIP joint two landmarks below it (thumb ignored), and works the same on a
+single hand or a (N, 21, 3) batch of recorded hands.
+"""
+from itertools import chain
+
+import numpy as np
+
+NUM_LANDMARKS = 21
+FINGER_TIPS = np.array([8, 12, 16, 20])
+FINGER_PIPS = FINGER_TIPS - 2
+
+# Fingers (thumb ignored) -> (command, label, BGR color)
+STOP = ("S", "STOP", (0, 0, 255))
+COMMANDS = {
+    1: ("F", "FORWARD", (0, 255, 0)),
+    2: ("B", "BACKWARD", (0, 165, 255)),
+    3: ("L", "LEFT", (255, 255, 0)),
+    4: ("R", "RIGHT", (255, 255, 0)),
+}
+# Same table indexed by finger count, for vectorized lookups.
+_COMMAND_CHARS = np.array([COMMANDS.get(n, STOP)[0] for n in range(len(FINGER_TIPS) + 1)])
+# Command -> (command, label, color)
+COMMAND_INFO = {c[0]: c for c in list(COMMANDS.values()) + [STOP]}
+
+WRIST, MIDDLE_MCP = 0, 9
+
+# Same topology as mediapipe's HAND_CONNECTIONS, for drawing from arrays
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+)
+MARGIN_REF = 0.15   # tip-PIP gap, in palm lengths, that counts as a fully clear finger
+
+
+def landmarks_to_array(hand_landmarks):
+    """(21, 3) float32 array straight from a MediaPipe NormalizedLandmarkList."""
+    pts = hand_landmarks.landmark
+    return np.fromiter(chain.from_iterable((lm.x, lm.y, lm.z) for lm in pts),
+                       dtype=np.float32, count=3 * len(pts)).reshape(-1, 3)
+
+
+def count_fingers_ignore_thumb(landmarks):
+    """Raised fingers for a (21, 3) hand (int) or a (N, 21, 3) batch (int array)."""
+    y = np.asarray(landmarks)[..., 1]
+    n = (y[..., FINGER_TIPS] < y[..., FINGER_PIPS]).sum(axis=-1)
+    return int(n) if n.ndim == 0 else n
+
+
+def finger_margin(landmarks):
+    """0..1 clarity of the finger count: the smallest tip-vs-PIP gap relative to palm size.
+
+    Close to 0 when some finger sits on the raised/folded threshold, i.e. the
+    frames that flicker between two counts.
+    """
+    lm = np.asarray(landmarks)
+    y = lm[..., 1]
+    gap = np.abs(y[..., FINGER_TIPS] - y[..., FINGER_PIPS]).min(axis=-1)
+    palm = np.linalg.norm(lm[..., MIDDLE_MCP, :2] - lm[..., WRIST, :2], axis=-1)
+    m = np.clip(gap / (np.maximum(palm, 1e-6) * MARGIN_REF), 0.0, 1.0)
+    return float(m) if m.ndim == 0 else m
+
+
+def command_for(fingers):
+    """(command, label, color) for a finger count."""
+    return COMMANDS.get(fingers, STOP)
+
+
+def classify_batch(landmarks):
+    """Command characters for a (N, 21, 3) batch, e.g. a recorded session."""
+    return _COMMAND_CHARS[count_fingers_ignore_thumb(landmarks)]
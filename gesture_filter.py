@@ -0,0 +1,76 @@
+"""Temporal filter between the per-frame classifier and the UDP sender.
+
+A hand on the edge between two finger counts flickers between commands at
+frame rate. GestureFilter only switches the output command when a new one
+wins an N-of-M vote over the recent frames, out-scores the current command
+by a margin (hysteresis, so a steady A/B flicker never takes over), the
+current command has been held for a minimum dwell time, and the frames
+voting for it are confident enough. Confidence comes from MediaPipe's handedness score times the
+finger margin from gesture.finger_margin(), so ambiguous frames count for
+less. A steady, deliberate gesture passes after `votes` frames.
+
+STOP is the safety command: by default it skips the vote and the dwell
+time and applies on the first confident frame (including "no hand").
+"""
+import time
+from collections import deque
+
+
+class GestureFilter:
+    def __init__(self, window=5, votes=3, min_dwell=0.25, min_confidence=0.3,
+                 initial="S", immediate=("S",), margin=0.3):
+        self.votes = votes                    # N of ...
+        self.history = deque(maxlen=window)   # ... M most recent (command, weight)
+        self.min_dwell = min_dwell            # seconds the output must be held before it can change
+        self.min_confidence = min_confidence  # frames below this do not vote
+        self.immediate = set(immediate)       # commands that bypass voting (e.g. a safety stop)
+        self.margin = margin                  # lead over the current command, as a fraction of the window weight
+
+        self.command = initial
+        self.changed_at = 0.0
+        self.frames = 0
+        self.transitions = 0
+        self.suppressed = 0   # frames whose raw command differed from the output and was held back
+
+    def reset(self, command="S"):
+        self.history.clear()
+        self.command = command
+        self.changed_at = 0.0
+
+    def update(self, command, confidence=1.0, now=None):
+        """Feed one frame's raw command; returns the filtered command."""
+        now = time.time() if now is None else now
+        self.frames += 1
+        weight = confidence if confidence >= self.min_confidence else 0.0
+        self.history.append((command, weight))
+
+        if command == self.command:
+            return self.command
+        if command in self.immediate and weight > 0:
+            return self._switch(command, now)
+
+        count, score, held, total = 0, 0.0, 0.0, 0.0
+        for c, w in self.history:
+            total += w
+            if c == command and w > 0:
+                count += 1
+                score += w
+            elif c == self.command:
+                held += w
+        if (count >= self.votes and score > total / 2
+                and score - held >= self.margin * total
+                and now - self.changed_at >= self.min_dwell):
+            return self._switch(command, now)
+
+        self.suppressed += 1
+        return self.command
+
+    def _switch(self, command, now):
+        self.command = command
+        self.changed_at = now
+        self.transitions += 1
+        return command
+
+    def stats(self):
+        return {"frames": self.frames, "transitions": self.transitions,
+                "suppressed": self.suppressed}
@@ -0,0 +1,82 @@
+"""Region-of-interest hand inference.
+
+MediaPipe gets the full camera frame on every tick even though the hand
+covers a small part of it. RoiHandTracker searches a downscaled copy of
+the frame until it finds a hand, then only feeds a padded crop around the
+previous frame's 21 landmarks. Landmarks are mapped back to full-frame
+normalized coordinates, so draw_landmarks and the finger counter work
+unchanged. When the hand leaves the crop it goes back to a full search.
+"""
+import cv2
+import numpy as np
+
+
+class RoiHandTracker:
+    def __init__(self, hands, detect_width=480, roi_width=256, pad=0.35, min_roi=96):
+        self.hands = hands
+        self.detect_width = detect_width   # width of the downscaled search frame
+        self.roi_width = roi_width         # crops wider than this are downscaled too
+        self.pad = pad                     # padding around the landmarks, as a fraction of the box
+        self.min_roi = min_roi
+        self.roi = None                    # (x0, y0, x1, y1) in full-frame pixels
+        self.full_searches = 0
+        self.roi_hits = 0
+
+    def reset(self):
+        self.roi = None
+
+    def process(self, rgb):
+        """Same contract as hands.process(rgb), landmarks in full-frame coordinates."""
+        if self.roi is not None:
+            res = self._process_roi(rgb)
+            if res.multi_hand_landmarks:
+                self.roi_hits += 1
+                return res
+            self.roi = None
+        return self._process_full(rgb)
+
+    # -------- stages --------
+    def _process_full(self, rgb):
+        self.full_searches += 1
+        res = self.hands.process(_downscale(rgb, self.detect_width))
+        # Resizing keeps normalized coordinates, so nothing to remap here.
+        self._update_roi(res, rgb.shape)
+        return res
+
+    def _process_roi(self, rgb):
+        h, w = rgb.shape[:2]
+        x0, y0, x1, y1 = self.roi
+        crop = np.ascontiguousarray(rgb[y0:y1, x0:x1])
+        res = self.hands.process(_downscale(crop, self.roi_width))
+        if res.multi_hand_landmarks:
+            sx, sy = (x1 - x0) / w, (y1 - y0) / h
+            ox, oy = x0 / w, y0 / h
+            for hand in res.multi_hand_landmarks:
+                for lm in hand.landmark:
+                    lm.x = ox + lm.x * sx
+                    lm.y = oy + lm.y * sy
+                    lm.z = lm.z * sx
+        self._update_roi(res, rgb.shape)
+        return res
+
+    def _update_roi(self, res, shape):
+        if not res.multi_hand_landmarks:
+            self.roi = None
+            return
+        h, w = shape[:2]
+        pts = res.multi_hand_landmarks[0].landmark
+        xs = [lm.x * w for lm in pts]
+        ys = [lm.y * h for lm in pts]
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        side = max(max(xs) - min(xs), max(ys) - min(ys)) * (1 + 2 * self.pad)
+        side = min(max(side, self.min_roi), w, h)
+        x0 = int(min(max(cx - side / 2, 0), w - side))
+        y0 = int(min(max(cy - side / 2, 0), h - side))
+        self.roi = (x0, y0, x0 + int(side), y0 + int(side))
+
+
+def _downscale(img, max_w):
+    h, w = img.shape[:2]
+    if w <= max_w:
+        return img
+    return cv2.resize(img, (max_w, int(h * max_w / w)), interpolation=cv2.INTER_AREA)
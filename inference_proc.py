@@ -0,0 +1,340 @@
+"""Hand inference in a separate process over shared memory.
+
+One SharedMemory block per camera ("lane") holds a small control area, a
+result record and a ring of frame slots. The GUI copies each BGR camera
+frame straight into a free slot (no pickling) and publishes its index;
+the worker always takes the newest slot, runs the configured detector
+backend (detectors.py) and writes only landmarks / finger count / outline
+into the result record. The result record is guarded by a version number
+written before and after the payload, so the reader never needs a lock:
+it retries if the two don't match.
+
+A worker can serve several lanes (fleet mode), round-robin, with one
+detector per lane so trackers keep per-camera state.
+
+Slot ownership: the producer never writes the latest published slot or
+the slot the worker has marked as READING; the worker re-checks the
+latest index after marking, so it never reads a slot being overwritten.
+
+A watchdog thread restarts the worker if it dies, backing off between
+attempts; after `max_restarts` crashes in a row it gives up and sets
+`failed`, and callers switch to an in-process detector. pending_sec() tells
+callers how long a submitted frame has gone unanswered, so they can stop
+acting on an old result while the worker is hung or restarting.
+"""
+import multiprocessing as mp
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from detectors import BACKENDS, Detection
+from gesture import NUM_LANDMARKS
+
+# Control words (int64)
+SEQ, SLOT, READING, STOP, HEARTBEAT = range(5)
+_CTRL_WORDS = 8
+MAX_OUTLINE = 64
+RESTART_BACKOFF_SEC = 0.5     # first restart delay, doubled per crash in a row
+MAX_BACKOFF_SEC = 10.0
+STABLE_SEC = 60.0             # a worker that ran this long resets the crash count
+
+RESULT_DTYPE = np.dtype([
+    ("version_begin", "<u8"),
+    ("frame_seq", "<u8"),
+    ("found", "u1"),                # 0 = no hand in the frame
+    ("has_landmarks", "u1"),
+    ("hand", "u1"),                 # 0 = unknown, 1 = left, 2 = right
+    ("fingers", "i1"),
+    ("backend", "u1"),              # index into detectors.BACKENDS
+    ("score", "<f4"),
+    ("infer_ms", "<f4"),
+    ("landmarks", "<f4", (NUM_LANDMARKS, 3)),
+    ("outline_n", "<u2"),
+    ("outline", "<i4", (MAX_OUTLINE, 2)),   # contour for backends without landmarks
+    ("version_end", "<u8"),
+])
+
+# detection: detectors.Detection or None; backend: name of the backend that produced it
+HandResult = namedtuple("HandResult", "seq detection infer_ms backend")
+
+
+class _Layout:
+    """Views over the shared block; identical in both processes."""
+
+    def __init__(self, buf, slots, max_shape):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        ctrl_n = _CTRL_WORDS + 3 * slots   # + per-slot (h, w, seq)
+        off = 0
+        self.ctrl = np.ndarray((ctrl_n,), np.int64, buf, off)
+        off += self.ctrl.nbytes
+        self.result = np.ndarray((), RESULT_DTYPE, buf, off)
+        off += RESULT_DTYPE.itemsize
+        off = (off + 63) & ~63
+        # Flat slots, so a frame smaller than max_shape is still one contiguous array
+        self.frames = np.ndarray((slots, int(np.prod(self.max_shape))), np.uint8, buf, off)
+
+    @staticmethod
+    def size(slots, max_shape):
+        return (8 * (_CTRL_WORDS + 3 * slots) + RESULT_DTYPE.itemsize + 63
+                + slots * int(np.prod(max_shape)))
+
+    def slot_meta(self, k):
+        i = _CTRL_WORDS + 3 * k
+        return self.ctrl[i:i + 3]
+
+    def view(self, k, h=None, w=None):
+        if h is None:
+            h, w, _ = self.slot_meta(k)
+        return self.frames[k, :h * w * 3].reshape(h, w, 3)
+
+
+############################################################
+# Worker process
+############################################################
+def _publish(res_rec, version, seq, det, detector):
+    res_rec["version_begin"] = version
+    res_rec["frame_seq"] = seq
+    res_rec["infer_ms"] = detector.cost.last() * 1000.0
+    res_rec["backend"] = BACKENDS.index(detector.backend)
+    res_rec["found"] = det is not None
+    if det is not None:
+        res_rec["hand"], res_rec["score"], res_rec["fingers"] = det.hand, det.score, det.fingers
+        res_rec["has_landmarks"] = det.landmarks is not None
+        if det.landmarks is not None:
+            res_rec["landmarks"] = det.landmarks
+        n = 0
+        if det.outline is not None:
+            pts = det.outline.reshape(-1, 2)
+            pts = pts[::-(-len(pts) // MAX_OUTLINE)]   # decimate to fit the record
+            n = len(pts)
+            res_rec["outline"][:n] = pts
+        res_rec["outline_n"] = n
+    res_rec["version_end"] = version
+
+
+def _worker_main(shm_names, slots, max_shape, backend, hands_kwargs, roi, max_cost_ms):
+    from detectors import make_detector   # only the worker pays for the model
+
+    shms = [shared_memory.SharedMemory(name=n) for n in shm_names]
+    lays = [_Layout(shm.buf, slots, max_shape) for shm in shms]
+    detectors = [make_detector(backend, roi=roi, max_cost_ms=max_cost_ms, hands_kwargs=hands_kwargs)
+                 for _ in lays]
+    for detector in detectors:
+        detector.warm_up(max_shape)   # the first heartbeat below means "ready"
+    versions = [int(lay.result["version_end"]) for lay in lays]
+    last_seq = [-1] * len(lays)
+    try:
+        while not lays[0].ctrl[STOP]:
+            beat = int(time.time() * 1000)
+            busy = False
+            # At most one frame per lane per pass, so a fast camera can't starve the others
+            for i, lay in enumerate(lays):
+                lay.ctrl[HEARTBEAT] = beat
+                if int(lay.ctrl[SEQ]) == last_seq[i]:
+                    continue
+                k = int(lay.ctrl[SLOT])
+                lay.ctrl[READING] = k
+                if int(lay.ctrl[SLOT]) != k:
+                    lay.ctrl[READING] = -1
+                    busy = True
+                    continue   # producer published again meanwhile; take the newer slot next pass
+                seq = int(lay.slot_meta(k)[2])
+                det = detectors[i].detect(lay.view(k))
+                lay.ctrl[READING] = -1
+                last_seq[i] = seq
+                versions[i] += 1
+                _publish(lay.result, versions[i], seq, det, detectors[i])
+                busy = True
+            if not busy:
+                time.sleep(0.002)
+    finally:
+        for detector in detectors:
+            detector.close()
+        del lays
+        for shm in shms:
+            shm.close()
+
+
+############################################################
+# Client (GUI side)
+############################################################
+class InferenceClient:
+    """One worker process serving `lanes` cameras; lane 0 is the default everywhere."""
+
+    def __init__(self, max_shape=(720, 1280, 3), slots=4, backend="mediapipe", roi=True,
+                 hands_kwargs=None, max_cost_ms=60.0, lanes=1, max_restarts=5):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.backend = backend
+        self.roi = roi
+        self.max_cost_ms = max_cost_ms
+        self.hands_kwargs = hands_kwargs or dict(max_num_hands=1, min_detection_confidence=0.7,
+                                                 min_tracking_confidence=0.6)
+        self.shms = [shared_memory.SharedMemory(create=True, size=_Layout.size(slots, self.max_shape))
+                     for _ in range(lanes)]
+        self.lays = [_Layout(shm.buf, slots, self.max_shape) for shm in self.shms]
+        for lay in self.lays:
+            lay.ctrl[:] = 0
+            lay.ctrl[SEQ] = -1
+            lay.ctrl[READING] = -1
+            lay.result["version_begin"] = lay.result["version_end"] = 0
+        self._seq = [0] * lanes
+        self._answered = [0] * lanes         # newest seq seen in a result
+        self._pending_since = [None] * lanes # time the oldest unanswered frame was submitted
+        self._scale = [1.0] * lanes          # downscale applied to the last submitted frame
+        self._ctx = mp.get_context("spawn")
+        self.proc = None
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.failed = False                  # gave up on the worker; use an in-process detector
+        self.submitted = 0
+        self.skipped = 0
+        self._spawned_at = 0.0
+        self._closing = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name="inference-watchdog", daemon=True)
+
+    @property
+    def lanes(self):
+        return len(self.lays)
+
+    def start(self):
+        self._spawn()
+        self._watchdog.start()
+        return self
+
+    def _spawn(self):
+        for lay in self.lays:
+            lay.ctrl[READING] = -1
+        self._spawned_at = time.time()
+        self.proc = self._ctx.Process(
+            target=_worker_main, name="hand-inference", daemon=True,
+            args=([shm.name for shm in self.shms], self.slots, self.max_shape, self.backend,
+                  self.hands_kwargs, self.roi, self.max_cost_ms))
+        self.proc.start()
+
+    def _watch(self):
+        crashes, backoff = 0, RESTART_BACKOFF_SEC
+        while not self._closing.wait(0.5):
+            if self.proc is None or self.proc.is_alive():
+                continue
+            if time.time() - self._spawned_at > STABLE_SEC:
+                crashes, backoff = 0, RESTART_BACKOFF_SEC   # a one-off crash, not a broken install
+            crashes += 1
+            if crashes > self.max_restarts:
+                print(f"Inference worker exited ({self.proc.exitcode}) {crashes} times in a row; giving up")
+                self.failed = True
+                return
+            print(f"Inference worker exited ({self.proc.exitcode}); restarting in {backoff:.1f} s")
+            if self._closing.wait(backoff):
+                return
+            self.restarts += 1
+            self._spawn()
+            backoff = min(backoff * 2, MAX_BACKOFF_SEC)
+
+    def wait_ready(self, timeout=30.0):
+        """Block until the worker has built and warmed up its detectors; False on timeout."""
+        end = time.time() + timeout
+        while not self.lays[-1].ctrl[HEARTBEAT]:
+            if time.time() > end or self.failed:
+                return False
+            time.sleep(0.01)
+        return True
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.is_alive()
+
+    def submit(self, bgr, lane=0):
+        """Copy a BGR frame into a free slot and publish it. Never waits for the worker.
+
+        Frames larger than max_shape (a camera that negotiated a bigger size)
+        are downscaled into the slot; outlines in results are mapped back.
+        """
+        h, w = bgr.shape[:2]
+        scale = min(1.0, self.max_shape[0] / h, self.max_shape[1] / w)
+        if scale < 1.0:
+            if self._scale[lane] == 1.0:
+                print(f"Frame {w}x{h} larger than shared slot {self.max_shape[1]}x{self.max_shape[0]}; downscaling")
+            h, w = min(int(h * scale), self.max_shape[0]), min(int(w * scale), self.max_shape[1])
+        lay = self.lays[lane]
+        ctrl = lay.ctrl
+        busy = (int(ctrl[SLOT]) if ctrl[SEQ] >= 0 else -1, int(ctrl[READING]))
+        k = next((i for i in range(self.slots) if i not in busy), None)
+        if k is None:
+            self.skipped += 1
+            return None
+        if scale < 1.0:
+            cv2.resize(bgr, (w, h), dst=lay.view(k, h, w), interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(lay.view(k, h, w), bgr)
+        self._scale[lane] = scale
+        self._seq[lane] += 1
+        seq = self._seq[lane]
+        meta = lay.slot_meta(k)
+        meta[0], meta[1], meta[2] = h, w, seq
+        ctrl[SLOT] = k
+        ctrl[SEQ] = seq
+        self.submitted += 1
+        if self._pending_since[lane] is None:
+            self._pending_since[lane] = time.time()
+        return seq
+
+    def pending_sec(self, lane=0):
+        """Seconds a submitted frame has waited for a result (0 when the worker is caught up)."""
+        t = self._pending_since[lane]
+        return 0.0 if t is None else time.time() - t
+
+    def _answered_up_to(self, lane, seq):
+        if seq > self._answered[lane]:
+            self._answered[lane] = seq
+            # Newer frames may still be in flight; they are timed from now
+            self._pending_since[lane] = None if seq >= self._seq[lane] else time.time()
+
+    def latest(self, lane=0):
+        """Newest HandResult, or None before the first one. Lock-free read."""
+        rec = self.lays[lane].result
+        for _ in range(4):
+            end = int(rec["version_end"])
+            snap = rec.copy()
+            if end == 0:
+                return None
+            if int(rec["version_begin"]) == end:
+                det = None
+                if snap["found"]:
+                    lm = snap["landmarks"].copy() if snap["has_landmarks"] else None
+                    n = int(snap["outline_n"])
+                    outline = snap["outline"][:n].copy() if n else None
+                    if outline is not None and self._scale[lane] < 1.0:
+                        outline = (outline / self._scale[lane]).astype(np.int32)
+                    det = Detection(lm, int(snap["fingers"]), int(snap["hand"]), float(snap["score"]), outline)
+                seq = int(snap["frame_seq"])
+                self._answered_up_to(lane, seq)
+                return HandResult(seq, det, float(snap["infer_ms"]), BACKENDS[int(snap["backend"])])
+        return None
+
+    def abandon(self):
+        """Stop the worker for good and mark the client failed (e.g. it never became ready)."""
+        self.failed = True
+        self._closing.set()
+        for lay in self.lays:
+            lay.ctrl[STOP] = 1
+        if self.proc is not None and self.proc.is_alive():
+            self.proc.terminate()
+
+    def close(self):
+        self._closing.set()
+        for lay in self.lays:
+            lay.ctrl[STOP] = 1
+        if self.proc is not None:
+            self.proc.join(2.0)
+            if self.proc.is_alive():
+                self.proc.terminate()
+        del self.lays
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
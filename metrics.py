@@ -0,0 +1,206 @@
+"""Hot-path instrumentation: stage timers, an on-screen HUD and exporters.
+
+Every stage duration goes into a fixed-size ring buffer, so recording a
+sample is a couple of array writes and memory use never grows. Event
+rates (frames, UDP sends) are derived from ring buffers of timestamps.
+
+    metrics = Metrics()
+    with metrics.timer("inference"):
+        res = hands.process(rgb)
+    metrics.mark("udp_send")
+    draw_hud(frame, metrics)
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+RING_SIZE = 240
+
+
+############################################################
+# Ring buffers
+############################################################
+class RingBuffer:
+    """Fixed-size float buffer keeping the most recent `size` samples."""
+
+    def __init__(self, size=RING_SIZE):
+        self._buf = np.zeros(size, dtype=np.float64)
+        self._n = 0
+
+    def push(self, value):
+        self._buf[self._n % len(self._buf)] = value
+        self._n += 1
+
+    def values(self):
+        return self._buf[:min(self._n, len(self._buf))]
+
+    def last(self):
+        return float(self._buf[(self._n - 1) % len(self._buf)]) if self._n else 0.0
+
+    def __len__(self):
+        return min(self._n, len(self._buf))
+
+
+class Metrics:
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.stages = {}    # name -> RingBuffer of seconds
+        self.events = {}    # name -> RingBuffer of timestamps
+        self.sources = {}   # name -> callable returning a JSON-able dict for snapshot()
+        self.lock = threading.Lock()
+
+    def _ring(self, table, name):
+        ring = table.get(name)
+        if ring is None:
+            with self.lock:
+                ring = table.setdefault(name, RingBuffer(self.size))
+        return ring
+
+    def record(self, name, seconds):
+        self._ring(self.stages, name).push(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def mark(self, name):
+        self._ring(self.events, name).push(time.time())
+
+    def ms(self, name):
+        """Mean of the buffered samples for a stage, in milliseconds."""
+        ring = self.stages.get(name)
+        return float(ring.values().mean()) * 1000.0 if ring is not None and len(ring) else 0.0
+
+    def rate(self, name, window=2.0):
+        """Events per second over the last `window` seconds."""
+        ring = self.events.get(name)
+        if ring is None or not len(ring):
+            return 0.0
+        ts = ring.values()
+        return int((ts > time.time() - window).sum()) / window
+
+    def add_source(self, name, fn):
+        """Include fn() under `name` in every snapshot (it runs on the exporter thread)."""
+        self.sources[name] = fn
+
+    def snapshot(self):
+        out = {"t": round(time.time(), 3)}
+        for name, ring in list(self.stages.items()):
+            if len(ring):
+                ms = ring.values() * 1000.0
+                p50, p95 = np.percentile(ms, [50, 95])
+                out[name] = {"last_ms": round(ring.last() * 1000.0, 2), "p50_ms": round(float(p50), 2),
+                             "p95_ms": round(float(p95), 2)}
+        for name in list(self.events):
+            out[f"{name}_hz"] = round(self.rate(name), 2)
+        for name, fn in list(self.sources.items()):
+            try:
+                out[name] = fn()
+            except Exception as e:
+                out[name] = {"error": str(e)}
+        return out
+
+
+############################################################
+# HUD
+############################################################
+def draw_hud(img, metrics, origin=None, frame_event="frame", send_event="udp_send"):
+    """FPS, inference ms / rate, frame age and UDP send rate in the bottom-right corner."""
+    h, w = img.shape[:2]
+    lines = [
+        f"FPS {metrics.rate(frame_event):5.1f}",
+        f"infer {metrics.ms('inference'):5.1f} ms",
+        f"infer {metrics.rate('inference_run'):5.1f} Hz",
+        f"age {metrics.ms('frame_age'):5.1f} ms",
+        f"udp {metrics.rate(send_event):5.1f}/s",
+    ]
+    if "glass_to_cmd" in metrics.stages:   # only while a capture.LatencyProbe runs
+        lines.append(f"g2c {metrics.ms('glass_to_cmd'):5.1f} ms")
+    x, y = origin or (w - 170, h - 20 * len(lines) - 10)
+    for i, txt in enumerate(lines):
+        cv2.putText(img, txt, (x, y + 20 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+    return img
+
+
+############################################################
+# Exporters
+############################################################
+class JsonlExporter:
+    """Appends one snapshot per interval to a size-rotated JSONL file."""
+
+    def __init__(self, metrics, path, interval=1.0, max_bytes=5 * 1024 * 1024, backups=3):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-jsonl", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(self.metrics.snapshot()) + "\n")
+            except OSError as e:
+                print(f"Metrics Error: {e}")
+
+
+class HttpExporter:
+    """Serves the latest snapshot as JSON on http://127.0.0.1:<port>/metrics."""
+
+    def __init__(self, metrics, port=9100, host="127.0.0.1"):
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics_ref.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -31,12 +31,45 @@ ESP8266WebServer server(80);
 WiFiUDP udp;
 unsigned int localUdpPort = 8888;
 char packetBuffer[255]; 
-int currentSpeed = 150; // PWM Speed (0-255)
+int currentSpeed = 150; // PWM Speed (0-255), set from the web page
+int leftSpeed = 150;    // Per-side PWM actually applied to the motors
+int rightSpeed = 150;
+char currentDir = 'S';
+
+// Binary control datagram (see protocol.py)
+const uint8_t CTRL_MAGIC = 0xC7;
+const uint8_t CTRL_VERSION = 1;
+const int CTRL_SIZE = 8;
+const uint8_t CTRL_FLAG_SPEED_ONLY = 0x01;
+const unsigned long CTRL_RESYNC_MS = 1000; // accept any seq after this much silence (client restarted)
+uint16_t lastCtrlSeq = 0;
+unsigned long lastCtrlMs = 0;
+bool haveCtrlSeq = false;
+
+// Pushed telemetry datagram (see protocol.py)
+const uint8_t TELEM_MAGIC = 0xC8;
+const uint8_t TELEM_VERSION = 1;
+const int TELEM_SIZE = 16;
+const uint8_t TELEM_FLAG_CTRL_SEQ = 0x01;      // lastCtrlSeq is valid
+const unsigned long TELEM_INTERVAL_MS = 500;
+const unsigned long TELEM_CLIENT_TIMEOUT_MS = 5000; // stop pushing once the client goes quiet
+IPAddress telemIP;
+uint16_t telemPort = 0;       // 0 = no client heard yet
+unsigned long lastClientMs = 0;
+unsigned long lastTelemMs = 0;
+uint16_t telemSeq = 0;
+uint32_t loopSumUs = 0;       // loop() timing since the last telemetry datagram
+uint32_t loopMaxUs = 0;
+uint16_t loopCount = 0;
 
 // Battery Calculation
 // Update these based on your voltage divider resistors
 // Example for 2-cell LiPo (8.4V max) mapped to 3.3V range
 float dividerRatio = 1.493; // Calibrate this value! (V_actual / V_measured)
+const unsigned long BAT_SAMPLE_MS = 200;
+const float BAT_ALPHA = 0.1;  // EMA weight of a new sample (~2 s time constant)
+float batteryVolts = 0;       // smoothed, updated by sampleBattery()
+unsigned long lastBatSampleMs = 0;
 
 void setup() {
   // Pin Modes
@@ -47,6 +80,7 @@ void setup() {
   pinMode(PIN_IN4, OUTPUT);
   pinMode(PIN_ENB, OUTPUT);
   pinMode(PIN_BAT, INPUT);
+  batteryVolts = readBatteryVolts();
   
   // Stop motors initially
   stopCar();
@@ -83,40 +117,53 @@ void setup() {
 }
 
 void loop() {
+  unsigned long t0 = micros();
   server.handleClient(); // Handle Web requests
   checkUDP();            // Handle OpenCV commands
+  sampleBattery();
+  sendTelemetry();       // Push battery / RSSI / loop time to the controller
+
+  uint32_t dt = micros() - t0;
+  loopSumUs += dt;
+  if (dt > loopMaxUs) loopMaxUs = dt;
+  if (loopCount < 0xFFFF) loopCount++;
 }
 
 // ================= MOTOR CONTROL =================
 void moveForward() {
+  currentDir = 'F';
   digitalWrite(PIN_IN1, HIGH); digitalWrite(PIN_IN2, LOW);
   digitalWrite(PIN_IN3, HIGH); digitalWrite(PIN_IN4, LOW);
-  analogWrite(PIN_ENA, currentSpeed); analogWrite(PIN_ENB, currentSpeed);
+  analogWrite(PIN_ENA, leftSpeed); analogWrite(PIN_ENB, rightSpeed);
   Serial.println("Motor: Forward");
 }
 
 void moveBackward() {
+  currentDir = 'B';
   digitalWrite(PIN_IN1, LOW); digitalWrite(PIN_IN2, HIGH);
   digitalWrite(PIN_IN3, LOW); digitalWrite(PIN_IN4, HIGH);
-  analogWrite(PIN_ENA, currentSpeed); analogWrite(PIN_ENB, currentSpeed);
+  analogWrite(PIN_ENA, leftSpeed); analogWrite(PIN_ENB, rightSpeed);
   Serial.println("Motor: Backward");
 }
 
 void turnLeft() {
+  currentDir = 'L';
   digitalWrite(PIN_IN1, LOW); digitalWrite(PIN_IN2, HIGH);
   digitalWrite(PIN_IN3, HIGH); digitalWrite(PIN_IN4, LOW);
-  analogWrite(PIN_ENA, currentSpeed); analogWrite(PIN_ENB, currentSpeed);
+  analogWrite(PIN_ENA, leftSpeed); analogWrite(PIN_ENB, rightSpeed);
   Serial.println("Motor: Left");
 }
 
 void turnRight() {
+  currentDir = 'R';
   digitalWrite(PIN_IN1, HIGH); digitalWrite(PIN_IN2, LOW);
   digitalWrite(PIN_IN3, LOW); digitalWrite(PIN_IN4, HIGH);
-  analogWrite(PIN_ENA, currentSpeed); analogWrite(PIN_ENB, currentSpeed);
+  analogWrite(PIN_ENA, leftSpeed); analogWrite(PIN_ENB, rightSpeed);
   Serial.println("Motor: Right");
 }
 
 void stopCar() {
+  currentDir = 'S';
   digitalWrite(PIN_IN1, LOW); digitalWrite(PIN_IN2, LOW);
   digitalWrite(PIN_IN3, LOW); digitalWrite(PIN_IN4, LOW);
   analogWrite(PIN_ENA, 0); analogWrite(PIN_ENB, 0);
@@ -124,28 +171,115 @@ void stopCar() {
 }
 
 // ================= BATTERY LOGIC =================
-int getBatteryPercentage() {
+float readBatteryVolts() {
   int raw = analogRead(PIN_BAT);
   // NodeMCU raw 0-1023 maps to 0-3.3V at the pin
   // If using a voltage divider, adjust math below.
   // Assuming a 2-cell LiPo (max 8.4V, min 6.0V)
   // Voltage at Pin = raw * (3.3 / 1023.0)
   // Actual Battery V = Voltage at Pin * dividerRatio
-  
-  float voltage = (raw * (3.3 / 1023.0)) * dividerRatio;
-  
+  return (raw * (3.3 / 1023.0)) * dividerRatio;
+}
+
+// Motor current makes single ADC reads jump around; keep a moving average
+void sampleBattery() {
+  unsigned long now = millis();
+  if (now - lastBatSampleMs < BAT_SAMPLE_MS) return;
+  lastBatSampleMs = now;
+  batteryVolts += BAT_ALPHA * (readBatteryVolts() - batteryVolts);
+}
+
+int getBatteryPercentage() {
   // Map 3.0V (0%) to 4.2V (100%)
-  int percent = map((long)(voltage * 100), 300, 420, 0, 100);
+  int percent = map((long)(batteryVolts * 100), 300, 420, 0, 100);
   percent = constrain(percent, 0, 100);
   return percent;
 }
 
+// ================= DIRECTION / SPEED HELPERS =================
+void applyDirection(char cmd) {
+  if (cmd == 'F') moveForward();
+  else if (cmd == 'B') moveBackward();
+  else if (cmd == 'L') turnLeft();
+  else if (cmd == 'R') turnRight();
+  else if (cmd == 'S') stopCar();
+}
+
+void applySpeed() {
+  // Only touch the enable pins while moving; stopCar() keeps them at 0.
+  if (currentDir != 'S') {
+    analogWrite(PIN_ENA, leftSpeed); analogWrite(PIN_ENB, rightSpeed);
+  }
+}
+
+// Binary packet: magic, version, seq (LE), dir, left PWM, right PWM, flags
+void handleControlPacket(const uint8_t* p) {
+  uint16_t seq = p[2] | (p[3] << 8);
+  unsigned long now = millis();
+  if (haveCtrlSeq && now - lastCtrlMs < CTRL_RESYNC_MS) {
+    // Drop duplicate / reordered packets (16-bit serial-number comparison)
+    uint16_t diff = seq - lastCtrlSeq;
+    if (diff == 0 || diff >= 0x8000) return;
+  }
+  lastCtrlSeq = seq;
+  lastCtrlMs = now;
+  haveCtrlSeq = true;
+
+  leftSpeed = p[5];
+  rightSpeed = p[6];
+  if (p[7] & CTRL_FLAG_SPEED_ONLY) applySpeed();
+  else if ((char)p[4] != currentDir) applyDirection((char)p[4]);
+  else applySpeed();
+}
+
+// ================= TELEMETRY PUSH =================
+static void putU16(uint8_t* p, uint16_t v) { p[0] = v & 0xFF; p[1] = v >> 8; }
+
+// magic, version, seq, battery mV, battery %, RSSI, loop avg/max us, last ctrl seq, dir, flags
+void sendTelemetry() {
+  unsigned long now = millis();
+  if (telemPort == 0 || now - lastTelemMs < TELEM_INTERVAL_MS) return;
+  if (now - lastClientMs > TELEM_CLIENT_TIMEOUT_MS) return;
+  lastTelemMs = now;
+
+  uint32_t avgUs = loopCount ? loopSumUs / loopCount : 0;
+  uint8_t p[TELEM_SIZE];
+  p[0] = TELEM_MAGIC;
+  p[1] = TELEM_VERSION;
+  putU16(p + 2, telemSeq++);
+  putU16(p + 4, (uint16_t)(batteryVolts * 1000));
+  p[6] = getBatteryPercentage();
+  p[7] = (uint8_t)(int8_t)(useAP ? 0 : WiFi.RSSI()); // the AP has no single link RSSI: 0 = unknown
+  putU16(p + 8, avgUs > 0xFFFF ? 0xFFFF : avgUs);
+  putU16(p + 10, loopMaxUs > 0xFFFF ? 0xFFFF : loopMaxUs);
+  putU16(p + 12, lastCtrlSeq);
+  p[14] = currentDir;
+  p[15] = haveCtrlSeq ? TELEM_FLAG_CTRL_SEQ : 0;
+  udp.beginPacket(telemIP, telemPort);
+  udp.write(p, TELEM_SIZE);
+  udp.endPacket();
+
+  loopSumUs = loopMaxUs = 0;
+  loopCount = 0;
+}
+
 // ================= UDP HANDLER (For Python/OpenCV) =================
 void checkUDP() {
   int packetSize = udp.parsePacket();
   if (packetSize) {
+    // Whoever talked to us last gets the telemetry stream
+    telemIP = udp.remoteIP();
+    telemPort = udp.remotePort();
+    lastClientMs = millis();
+
     int len = udp.read(packetBuffer, 255);
     if (len > 0) packetBuffer[len] = 0;
+
+    if (len == CTRL_SIZE && (uint8_t)packetBuffer[0] == CTRL_MAGIC &&
+        (uint8_t)packetBuffer[1] == CTRL_VERSION) {
+      handleControlPacket((const uint8_t*)packetBuffer);
+      return;
+    }
     
     char cmd = packetBuffer[0];
     
@@ -173,6 +307,8 @@ void handleSetSpeed() {
     currentSpeed = server.arg("value").toInt();
     if (currentSpeed < 0) currentSpeed = 0;
     if (currentSpeed > 255) currentSpeed = 255;
+    leftSpeed = rightSpeed = currentSpeed;
+    applySpeed();
     Serial.println("Speed updated to: " + String(currentSpeed));
   }
   server.send(200, "text/plain", "OK");
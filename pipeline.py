@@ -0,0 +1,191 @@
+"""Threaded capture -> inference -> render pipeline.
+
+Stages hand work to each other through LatestQueue, a small bounded queue
+that throws away the oldest entry when it is full. A slow stage therefore
+always picks up the newest frame instead of working through a backlog, and
+the age of what ends up on screen (and in the UDP command) stays bounded.
+"""
+import threading
+import time
+from collections import deque
+
+
+############################################################
+# Bounded drop-oldest queue
+############################################################
+class LatestQueue:
+    def __init__(self, maxsize=1, on_drop=None):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.on_drop = on_drop    # on_drop(item) for entries thrown away unread
+        self.dropped = 0
+
+    def put(self, item):
+        old = None
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                old = self._items[0]
+            self._items.append(item)
+            self._cond.notify()
+        if old is not None and self.on_drop is not None:
+            self.on_drop(old)
+
+    def get(self, timeout=None):
+        """Oldest queued item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+############################################################
+# Work items
+############################################################
+class Frame:
+    __slots__ = ("seq", "t_capture", "image")
+
+    def __init__(self, seq, t_capture, image):
+        self.seq = seq
+        self.t_capture = t_capture
+        self.image = image
+
+
+class Result:
+    __slots__ = ("frame", "payload", "t_done")
+
+    def __init__(self, frame, payload, t_done):
+        self.frame = frame
+        self.payload = payload
+        self.t_done = t_done
+
+    @property
+    def age(self):
+        """Seconds between the frame leaving the camera and now."""
+        return time.time() - self.frame.t_capture
+
+
+############################################################
+# Pipeline
+############################################################
+class CapturePipeline:
+    """Capture thread + inference worker feeding a render stage.
+
+    `process(frame)` runs on the inference thread with the captured Frame
+    and its return value is delivered, together with that Frame, through
+    `latest()`. With a FramePool the camera frame goes back to the pool
+    once process() returns (or when it is dropped unprocessed), and
+    `release(result)` is called for results dropped before the render
+    stage saw them, so pooled buffers in the payload can be handed back. The
+    render stage (usually a QTimer on the GUI thread) only ever sees
+    finished results.
+    """
+
+    def __init__(self, cap, process, frame_queue_size=1, result_queue_size=1, metrics=None, pool=None,
+                 release=None):
+        self.cap = cap
+        self.process = process
+        self.metrics = metrics
+        self.pool = pool    # frames.FramePool: camera frames are read into its "capture" ring
+        self.frames = LatestQueue(frame_queue_size, on_drop=self._release_frame)
+        self.results = LatestQueue(result_queue_size, on_drop=release)
+        self.captured = 0
+        self.processed = 0
+        self.rendered = 0
+        self.errors = 0
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running
+
+    def _capture_loop(self):
+        seq = 0
+        shape = None
+        while self._running:
+            t0 = time.perf_counter()
+            if self.pool is not None and shape is not None:
+                buf = self.pool.get("capture", shape)
+                ok, img = self.cap.read(buf)
+                if not ok or img is not buf:
+                    self.pool.release(buf)
+                if ok and img is not buf:
+                    shape = img.shape           # driver changed resolution
+            else:
+                ok, img = self.cap.read()
+                if ok:
+                    shape = img.shape
+            if self.metrics is not None:
+                self.metrics.record("capture", time.perf_counter() - t0)
+            if not ok:
+                time.sleep(0.01)
+                continue
+            seq += 1
+            self.captured += 1
+            self.frames.put(Frame(seq, time.time(), img))
+
+    def _inference_loop(self):
+        while self._running:
+            frame = self.frames.get(timeout=0.1)
+            if frame is None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                payload = self.process(frame)
+            except Exception as e:
+                self.errors += 1
+                print(f"Inference Error: {e}")
+                continue
+            finally:
+                self._release_frame(frame)
+            if self.metrics is not None:
+                self.metrics.record("process", time.perf_counter() - t0)
+            self.processed += 1
+            self.results.put(Result(frame, payload, time.time()))
+
+    def _release_frame(self, frame):
+        if self.pool is not None:
+            self.pool.release(frame.image)
+
+    def latest(self):
+        """Newest finished Result, or None if nothing new since last call."""
+        res = self.results.get_nowait()
+        if res is not None:
+            self.rendered += 1
+        return res
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "processed": self.processed,
+            "rendered": self.rendered,
+            "dropped_capture": self.frames.dropped,
+            "dropped_render": self.results.dropped,
+            "errors": self.errors,
+        }
@@ -0,0 +1,131 @@
+"""Low-rate MJPEG preview over HTTP, for controllers without a display.
+
+Open http://127.0.0.1:<port>/ in a browser (or /stream in VLC, or
+/snapshot.jpg for one frame). The control loop asks due() before it
+draws anything: it is False unless a client is connected and the last
+preview frame is older than 1/fps, so an unwatched preview costs one
+attribute check per frame. offer() JPEG-encodes the frame (a few ms at
+the low preview rate) and wakes the streaming threads.
+
+    preview = MjpegPreview(8090, fps=2).start()
+    if preview.due():
+        draw_overlay(img)
+        preview.offer(img)
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+BOUNDARY = "frame"
+PAGE = b"<html><body style='margin:0;background:#111'><img src='/stream' style='width:100%'></body></html>"
+
+
+class MjpegPreview:
+    def __init__(self, port=8090, fps=2.0, width=480, quality=70, host="127.0.0.1"):
+        self.interval = 1.0 / fps
+        self.width = width          # downscale to this width before encoding
+        self.quality = quality
+        self.clients = 0
+        self.frames = 0
+        self._jpeg = None
+        self._last = 0.0
+        self._cond = threading.Condition()
+        self._stop = False
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path == "":
+                    self._send(200, "text/html", PAGE)
+                elif path == "/snapshot.jpg":
+                    with preview._cond:
+                        preview.clients += 1     # makes the control loop produce a frame
+                    try:
+                        jpeg = preview.wait_frame(preview._jpeg, 5.0)
+                    finally:
+                        with preview._cond:
+                            preview.clients -= 1
+                    if jpeg is None:
+                        self.send_error(503, "no frame yet")
+                    else:
+                        self._send(200, "image/jpeg", jpeg)
+                elif path == "/stream":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _send(self, code, ctype, body):
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with preview._cond:
+                    preview.clients += 1
+                try:
+                    jpeg = None
+                    while not preview._stop:
+                        nxt = preview.wait_frame(jpeg, 5.0)
+                        if nxt is None or nxt is jpeg:
+                            continue
+                        jpeg = nxt
+                        self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # viewer closed the page
+                finally:
+                    with preview._cond:
+                        preview.clients -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="preview-http", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def due(self):
+        """True when someone is watching and a new preview frame is wanted."""
+        return self.clients > 0 and time.time() - self._last >= self.interval
+
+    def offer(self, img):
+        self._last = time.time()
+        h, w = img.shape[:2]
+        if w > self.width:
+            img = cv2.resize(img, (self.width, h * self.width // w), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = buf.tobytes()
+            self.frames += 1
+            self._cond.notify_all()
+
+    def wait_frame(self, current, timeout):
+        """Newest JPEG, waiting up to `timeout` for one different from `current`."""
+        with self._cond:
+            if self._jpeg is None or self._jpeg is current:
+                self._cond.wait(timeout)
+            return self._jpeg
+
+    def stop(self):
+        self._stop = True
+        with self._cond:
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
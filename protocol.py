@@ -0,0 +1,134 @@
+"""Binary control datagram shared with opencv_car.ino.
+
+Fixed 8-byte little-endian packet, parsed by checkUDP() on the car:
+
+    offset  size  field
+    0       1     magic 0xC7 (never a printable ASCII command)
+    1       1     version (1)
+    2       2     sequence number, wraps at 65536
+    4       1     direction: 'F', 'B', 'L', 'R' or 'S'
+    5       1     left PWM  0-255
+    6       1     right PWM 0-255
+    7       1     flags (FLAG_SPEED_ONLY: update PWM, keep current direction)
+
+The single-letter ASCII commands and the 'V' battery request keep working,
+so cv.py and the car's web page are unaffected.
+
+The car pushes a 16-byte telemetry datagram every 500 ms to whichever
+client sent it something in the last few seconds:
+
+    offset  size  field
+    0       1     magic 0xC8
+    1       1     version (1)
+    2       2     telemetry sequence number, wraps at 65536
+    4       2     smoothed battery voltage, mV
+    6       1     battery percent
+    7       1     WiFi RSSI, dBm (signed; 0 = unknown, e.g. in AP mode)
+    8       2     mean loop() time since the last datagram, us
+    10      2     max loop() time since the last datagram, us
+    12      2     sequence number of the last control datagram applied
+    14      1     current direction
+    15      1     flags (TEL_FLAG_CTRL_SEQ: field 12 is valid)
+"""
+import struct
+from collections import namedtuple
+
+MAGIC = 0xC7
+VERSION = 1
+FLAG_SPEED_ONLY = 0x01
+
+DIRECTIONS = b"FBLRS"
+
+_CONTROL = struct.Struct("<BBHcBBB")
+PACKET_SIZE = _CONTROL.size
+
+ControlPacket = namedtuple("ControlPacket", "seq direction left right flags")
+
+TELEMETRY_MAGIC = 0xC8
+TEL_FLAG_CTRL_SEQ = 0x01
+
+_TELEMETRY = struct.Struct("<BBHHBbHHHcB")
+TELEMETRY_SIZE = _TELEMETRY.size
+
+Telemetry = namedtuple("Telemetry", "seq battery_mv battery_pct rssi loop_avg_us loop_max_us "
+                                    "ctrl_seq direction flags")
+
+
+def encode_control(seq, direction, left, right, flags=0):
+    if isinstance(direction, str):
+        direction = direction.encode()
+    if len(direction) != 1 or direction not in DIRECTIONS:
+        raise ValueError(f"unknown direction {direction!r}")
+    return _CONTROL.pack(MAGIC, VERSION, seq & 0xFFFF, direction,
+                         _pwm(left), _pwm(right), flags & 0xFF)
+
+
+def decode_control(data):
+    """ControlPacket, or None if `data` is not a v1 control datagram."""
+    if len(data) != PACKET_SIZE:
+        return None
+    magic, version, seq, direction, left, right, flags = _CONTROL.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return ControlPacket(seq, direction.decode(), left, right, flags)
+
+
+def encode_telemetry(seq, battery_mv, battery_pct, rssi=0, loop_avg_us=0, loop_max_us=0,
+                     ctrl_seq=0, direction="S", flags=0):
+    """Inverse of decode_telemetry: packs what the firmware sends, for simulated cars."""
+    if isinstance(direction, str):
+        direction = direction.encode()
+    return _TELEMETRY.pack(TELEMETRY_MAGIC, VERSION, seq & 0xFFFF, battery_mv, battery_pct, rssi,
+                           min(loop_avg_us, 0xFFFF), min(loop_max_us, 0xFFFF), ctrl_seq & 0xFFFF,
+                           direction, flags & 0xFF)
+
+
+def decode_telemetry(data):
+    """Telemetry, or None if `data` is not a v1 telemetry datagram."""
+    if len(data) != TELEMETRY_SIZE:
+        return None
+    magic, version, *fields, direction, flags = _TELEMETRY.unpack(data)
+    if magic != TELEMETRY_MAGIC or version != VERSION:
+        return None
+    return Telemetry(*fields, direction.decode(errors="replace"), flags)
+
+
+def is_stop(data):
+    """STOP in either format: ASCII 'S' or a control datagram that sets direction 'S'."""
+    if data == b"S":
+        return True
+    pkt = decode_control(data)
+    return pkt is not None and pkt.direction == "S" and not pkt.flags & FLAG_SPEED_ONLY
+
+
+def is_telemetry(data):
+    """Cheap check for pushed telemetry (anything else from the car answers a request)."""
+    return len(data) == TELEMETRY_SIZE and data[0] == TELEMETRY_MAGIC
+
+
+def _pwm(v):
+    return max(0, min(255, int(v)))
+
+
+class ControlEncoder:
+    """Keeps the sequence counter and the current speed for one car."""
+
+    def __init__(self, speed=150):
+        self.seq = 0
+        self.left = self.right = _pwm(speed)
+        self.direction = "S"
+
+    def set_speed(self, left, right=None):
+        self.left = _pwm(left)
+        self.right = self.left if right is None else _pwm(right)
+
+    def _next(self, flags):
+        self.seq = (self.seq + 1) & 0xFFFF
+        return encode_control(self.seq, self.direction, self.left, self.right, flags)
+
+    def command(self, direction):
+        self.direction = direction
+        return self._next(0)
+
+    def speed_update(self):
+        return self._next(FLAG_SPEED_ONLY)
@@ -0,0 +1,155 @@
+"""Background recorder for annotated video plus per-frame telemetry.
+
+The control loop only calls offer(): it checks the frame-skip counter and
+the queue, copies the frame and returns. Encoding (resize + VideoWriter)
+and the telemetry sidecar run on the recorder thread. When the queue is
+full the recording frame is dropped and counted; the live frame is
+never delayed.
+
+The file is written at a fixed `fps`, but frames are placed by the time
+they were offered: a frame is repeated to cover a gap and skipped when it
+arrives ahead of its slot, so playback runs at wall-clock speed whatever
+rate the control loop actually managed. A pause longer than `max_gap_sec`
+starts a new segment instead of filling it with copies.
+
+Output is split into segments, each a video file plus a JSONL file with
+one line per recorded frame (time, command, battery, link state...):
+
+    drives/run_20240501-142233_000.avi
+    drives/run_20240501-142233_000.jsonl
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+
+class VideoRecorder:
+    def __init__(self, prefix, codec="MJPG", fps=15.0, size=None, every=2, segment_sec=300.0,
+                 max_pending=8, metrics=None, max_gap_sec=2.0):
+        self.prefix = prefix            # path prefix; a timestamp and segment number are appended
+        self.codec = codec
+        self.fps = fps                  # file frame rate; frames are paced to it by timestamp
+        self.size = size                # (w, h) to resize to, or None to keep the frame size
+        self.every = max(1, every)      # record one frame out of `every` offered
+        self.segment_sec = segment_sec
+        self.max_gap_sec = max_gap_sec
+        self.metrics = metrics
+        self._q = queue.Queue(maxsize=max_pending)
+        self._stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._writer = None
+        self._sidecar = None
+        self._segment_start = 0.0
+        self._segment_frames = 0
+        self._last_t = 0.0
+        self._offered = 0
+        self.segments = 0
+        self.written = 0
+        self.dropped = 0
+        self.repeated = 0               # extra copies written to cover gaps
+        self.skipped = 0                # frames that arrived ahead of their slot
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+
+    def start(self):
+        d = os.path.dirname(self.prefix)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def offer(self, frame, telemetry=None):
+        """Hand a frame to the recorder; never blocks. Returns False if it was dropped."""
+        self._offered += 1
+        if (self._offered - 1) % self.every:
+            return False
+        if self._q.full():
+            self.dropped += 1
+            return False
+        try:
+            self._q.put_nowait((time.time(), frame.copy(), telemetry))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def stats(self):
+        return {"queue": self._q.qsize(), "written": self.written, "dropped": self.dropped,
+                "repeated": self.repeated, "skipped": self.skipped, "segments": self.segments,
+                "errors": self.errors}
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(5.0)
+
+    # -------- recorder thread --------
+    def _open_segment(self, shape, t):
+        self._close_segment()
+        w, h = self.size or (shape[1], shape[0])
+        base = f"{self.prefix}_{self._stamp}_{self.segments:03d}"
+        ext = ".mp4" if self.codec in ("mp4v", "avc1", "H264") else ".avi"
+        self._writer = cv2.VideoWriter(base + ext, cv2.VideoWriter_fourcc(*self.codec), self.fps, (w, h))
+        if not self._writer.isOpened():
+            raise OSError(f"cannot open video writer for {base + ext} ({self.codec})")
+        self._sidecar = open(base + ".jsonl", "w")
+        self._segment_start = t
+        self._segment_frames = 0
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if self._sidecar is not None:
+            self._sidecar.close()
+            self._sidecar = None
+
+    def _write(self, t, frame, telemetry):
+        if (self._writer is None or t - self._segment_start >= self.segment_sec
+                or t - self._last_t > self.max_gap_sec):
+            self._open_segment(frame.shape, t)
+        self._last_t = t
+        t0 = time.perf_counter()
+        # Video frames that should exist once this one is shown, by its timestamp
+        target = int(round((t - self._segment_start) * self.fps)) + 1
+        copies = target - self._segment_frames
+        if copies > 0:
+            if self.size and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+                frame = cv2.resize(frame, tuple(self.size), interpolation=cv2.INTER_AREA)
+            for _ in range(copies):
+                self._writer.write(frame)
+            index = self._segment_frames
+            self._segment_frames = target
+            self.written += 1
+            self.repeated += copies - 1
+        else:
+            index = self._segment_frames - 1    # ahead of its slot: the sidecar points at the frame on screen
+            self.skipped += 1
+        rec = {"t": round(t, 3), "frame": index}   # frame index within the segment video
+        if telemetry:
+            rec.update(telemetry)
+        self._sidecar.write(json.dumps(rec, default=float) + "\n")
+        if self.metrics is not None:
+            self.metrics.record("record", time.perf_counter() - t0)
+
+    def _run(self):
+        try:
+            while not (self._stop.is_set() and self._q.empty()):
+                try:
+                    item = self._q.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    # A broken writer must not take the control loop down with it
+                    self.errors += 1
+                    print(f"Recorder error: {e}")
+                    self._close_segment()
+                    time.sleep(1.0)
+        finally:
+            self._close_segment()
@@ -0,0 +1,89 @@
+"""Motion-gated, budget-aware scheduling of hand inference.
+
+InferenceScheduler sits in front of hands.process and decides per frame
+whether to run the model:
+
+* Motion gate: a tiny grayscale thumbnail of the hand region (or the
+  whole frame while no hand is known) is compared with the one from the
+  last inference. If nothing moved, the previous landmarks and command
+  are reused. A refresh is still forced every `max_skip_sec`.
+* Budget: when the measured frame time goes over `budget_ms` the minimum
+  interval between inferences grows; it shrinks again once there is
+  headroom, so a moving hand is tracked at full rate whenever possible.
+"""
+import time
+
+import cv2
+import numpy as np
+
+THUMB = (32, 32)
+
+
+class InferenceScheduler:
+    def __init__(self, motion_threshold=3.0, max_skip_sec=0.5, budget_ms=40.0, min_hz=5.0,
+                 pad=0.15):
+        self.motion_threshold = motion_threshold   # mean abs gray-level change (0-255) that counts as motion
+        self.max_skip_sec = max_skip_sec
+        self.budget = budget_ms / 1000.0
+        self.max_interval = 1.0 / min_hz
+        self.pad = pad
+
+        self.interval = 0.0          # current minimum time between inferences
+        self.frame_time = None       # EMA of measured frame time
+        self.region = None           # normalized (x0, y0, x1, y1) of the last hand
+        self._thumb = None
+        self._thumb_region = None
+        self._last_run = 0.0
+        self.skipped_still = 0
+        self.skipped_budget = 0
+
+    def set_hand(self, landmarks):
+        """Track the padded bounding box of the latest (21, 3) landmarks (or None)."""
+        if landmarks is None:
+            self.region = None
+            return
+        lm = np.asarray(landmarks)
+        x0, y0 = lm[:, 0].min(), lm[:, 1].min()
+        x1, y1 = lm[:, 0].max(), lm[:, 1].max()
+        px, py = (x1 - x0) * self.pad, (y1 - y0) * self.pad
+        region = (max(0.0, x0 - px), max(0.0, y0 - py), min(1.0, x1 + px), min(1.0, y1 + py))
+        if self.region is not None:
+            # Keep the box while the hand stays put, so consecutive thumbnails are comparable
+            tol = 0.1 * max(region[2] - region[0], region[3] - region[1])
+            if all(abs(a - b) < tol for a, b in zip(region, self.region)):
+                return
+        self.region = region
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        if self.region is not None:
+            x0, y0, x1, y1 = self.region
+            frame = frame[int(y0 * h):max(int(y1 * h), int(y0 * h) + 1),
+                          int(x0 * w):max(int(x1 * w), int(x0 * w) + 1)]
+        # Subsample before resizing so the check stays well under a millisecond at 720p
+        step = max(1, min(frame.shape[0], frame.shape[1]) // (4 * THUMB[0]))
+        small = cv2.resize(frame[::step, ::step], THUMB, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def should_infer(self, frame, now=None):
+        now = time.time() if now is None else now
+        if now - self._last_run < self.interval:
+            self.skipped_budget += 1
+            return False
+        thumb = self._thumbnail(frame)
+        if (self._thumb is not None and self._thumb_region == self.region
+                and now - self._last_run < self.max_skip_sec
+                and np.abs(thumb - self._thumb).mean() < self.motion_threshold):
+            self.skipped_still += 1
+            return False
+        self._thumb, self._thumb_region = thumb, self.region
+        self._last_run = now
+        return True
+
+    def frame_done(self, seconds):
+        """Feed the measured time of a whole frame (or of one worker inference); adapts the interval."""
+        self.frame_time = seconds if self.frame_time is None else 0.8 * self.frame_time + 0.2 * seconds
+        if self.frame_time > self.budget:
+            self.interval = min(self.max_interval, max(self.interval * 1.25, 0.01))
+        elif self.frame_time < 0.7 * self.budget:
+            self.interval = self.interval * 0.9 if self.interval > 0.005 else 0.0
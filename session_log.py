@@ -0,0 +1,235 @@
+"""Compact record/replay format for landmark streams and command decisions.
+
+A session file is a 32-byte header followed by fixed-size records
+(RECORD_DTYPE), so it can be appended to while driving and opened later
+with np.memmap without parsing. SessionWriter hands records to a
+background thread; log() never touches the disk and never blocks.
+The header also keeps the debounce filter and send throttle settings the
+session was recorded with (zero in files from before they were stored).
+
+Replay a recording through the current classifier, debounce filter and
+send throttle (recorded settings unless overridden on the command line):
+
+    python session_log.py replay drive.gcl
+    python session_log.py replay drive.gcl --votes 2 --dwell 0.15
+"""
+import argparse
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+from gesture import NUM_LANDMARKS, classify_batch, count_fingers_ignore_thumb, finger_margin
+from gesture_filter import GestureFilter
+
+MAGIC = b"GCLOG\0\0\0"
+VERSION = 1
+# magic, version, record size, start time, filter window, votes, dwell (s), send throttle (s)
+_HEADER = struct.Struct("<8sHHdBBxxff")
+HEADER_SIZE = _HEADER.size   # 32
+
+HAND_NONE, HAND_LEFT, HAND_RIGHT = 0, 1, 2
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),                                 # time.time() when the frame was captured
+    ("landmarks", "<f4", (NUM_LANDMARKS, 3)),     # normalized x, y, z
+    ("hand", "u1"),                               # HAND_NONE / HAND_LEFT / HAND_RIGHT
+    ("hand_score", "<f4"),                        # handedness score (detector score without landmarks)
+    ("fingers", "i1"),                            # -1 when no hand
+    ("raw_command", "S1"),                        # per-frame classifier output
+    ("command", "S1"),                            # command after debouncing (what was sent)
+    ("confidence", "<f4"),
+    ("battery", "<f4"),                           # percent, NaN if unknown
+    ("rtt_ms", "<f4"),                            # NaN if unknown
+])
+
+
+def parse_battery(text):
+    """Battery percent from the car's reply text, None if unknown ("N/A")."""
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+############################################################
+# Writer
+############################################################
+class SessionWriter:
+    """`gesture_filter` and `throttle_sec` are only read here, to store their settings in the header."""
+
+    def __init__(self, path, gesture_filter=None, throttle_sec=0.0, max_pending=4096, flush_sec=1.0):
+        self.path = path
+        self.flush_sec = flush_sec
+        self._q = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.dropped = 0
+        params = {"window": 0, "votes": 0, "dwell_sec": 0.0, "throttle_sec": float(throttle_sec or 0.0)}
+        if gesture_filter is not None:
+            params.update(window=gesture_filter.history.maxlen, votes=gesture_filter.votes,
+                          dwell_sec=float(gesture_filter.min_dwell))
+        self._f = open(path, "ab")
+        if self._f.tell() == 0:
+            self._f.write(_HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, time.time(),
+                                       params["window"], params["votes"], params["dwell_sec"],
+                                       params["throttle_sec"]))
+        else:
+            recorded = read_params(path)
+            if any(abs(recorded[k] - v) > 1e-6 for k, v in params.items()):
+                print(f"{path}: appending with settings {params}, the header keeps {recorded}")
+            # Drop a partial record left by a crash so appends stay aligned.
+            tail = (self._f.tell() - HEADER_SIZE) % RECORD_DTYPE.itemsize
+            if tail:
+                self._f.truncate(self._f.tell() - tail)
+                self._f.seek(0, os.SEEK_END)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    def log(self, t, landmarks=None, hand=HAND_NONE, hand_score=0.0, fingers=-1, raw_command="S",
+            command="S", confidence=0.0, battery=None, rtt_ms=None):
+        rec = np.zeros((), RECORD_DTYPE)
+        rec["t"] = t
+        if landmarks is not None:
+            rec["landmarks"] = landmarks
+        rec["hand"] = hand
+        rec["hand_score"] = hand_score
+        rec["fingers"] = fingers
+        rec["raw_command"] = raw_command
+        rec["command"] = command
+        rec["confidence"] = confidence
+        rec["battery"] = np.nan if battery is None else battery
+        rec["rtt_ms"] = np.nan if rtt_ms is None else rtt_ms
+        try:
+            self._q.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(2.0)
+        self._f.close()
+
+    def _run(self):
+        last_flush = time.time()
+        while not (self._stop.is_set() and self._q.empty()):
+            try:
+                batch = [self._q.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            self._f.write(np.stack(batch).tobytes())
+            self.written += len(batch)
+            if time.time() - last_flush >= self.flush_sec:
+                self._f.flush()
+                last_flush = time.time()
+        self._f.flush()
+
+
+############################################################
+# Reader / replay
+############################################################
+def _check_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{path}: truncated header")
+    magic, version, rec_size, *rest = _HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION or rec_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: not a v{VERSION} session log")
+    return rest
+
+
+def read_params(path):
+    """Filter/throttle settings stored in the header; 0 where the file predates them."""
+    _, window, votes, dwell, throttle = _check_header(path)
+    return {"window": window, "votes": votes, "dwell_sec": round(dwell, 6), "throttle_sec": round(throttle, 6)}
+
+
+def open_session(path):
+    """Records as a read-only memory-mapped structured array."""
+    _check_header(path)
+    n = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
+
+
+def replay(records, make_filter=GestureFilter, throttle_sec=0.5):
+    """Re-run the classifier, the debounce filter and the send throttle over recorded landmarks.
+
+    Classification is one vectorized call over the whole session; the
+    filter and throttle then run frame by frame on the recorded capture
+    times. `sent` marks the frames whose command would go out as a
+    datagram; resends the apps make between logged frames are not seen.
+    """
+    has_hand = records["hand"] != HAND_NONE
+    lm = np.asarray(records["landmarks"])
+    raw = np.where(has_hand, classify_batch(lm), "S")
+    fingers = np.where(has_hand, count_fingers_ignore_thumb(lm), -1)
+    conf = np.where(has_hand, records["hand_score"] * finger_margin(lm), 1.0)
+    # Frames from a landmark-free backend (OpenCV contours) keep their recorded decision
+    contour = ~has_hand & (records["fingers"] >= 0)
+    raw = np.where(contour, records["raw_command"].astype("U1"), raw)
+    fingers = np.where(contour, records["fingers"], fingers)
+    conf = np.where(contour, records["confidence"], conf)
+
+    filt = make_filter()
+    out = np.empty(len(records), dtype="U1")
+    sent = np.zeros(len(records), dtype=bool)
+    last_cmd, last_send = "S", 0.0      # same starting state as the apps
+    for i, (c, w, t) in enumerate(zip(raw.tolist(), conf.tolist(), records["t"].tolist())):
+        cmd = out[i] = filt.update(c, w, now=t)
+        if cmd != last_cmd or t - last_send > throttle_sec:
+            sent[i] = True
+            last_cmd, last_send = cmd, t
+    return {"fingers": fingers, "raw_command": raw, "command": out, "sent": sent,
+            "filter": filt.stats()}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Session log tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("replay", help="replay a session through the current classifier")
+    rp.add_argument("path")
+    rp.add_argument("--window", type=int, help="filter window (default: as recorded)")
+    rp.add_argument("--votes", type=int, help="votes needed to switch (default: as recorded)")
+    rp.add_argument("--dwell", type=float, help="minimum dwell, s (default: as recorded)")
+    rp.add_argument("--throttle", type=float, help="send throttle, s (default: as recorded)")
+    args = ap.parse_args(argv)
+
+    recs = open_session(args.path)
+    if not len(recs):
+        print("empty session")
+        return
+    rec = read_params(args.path)
+    defaults = GestureFilter()
+    window = args.window or rec["window"] or defaults.history.maxlen
+    votes = args.votes or rec["votes"] or defaults.votes
+    dwell = args.dwell if args.dwell is not None else (rec["dwell_sec"] if rec["window"] else defaults.min_dwell)
+    throttle = args.throttle if args.throttle is not None else (rec["throttle_sec"] or 0.5)
+    t0 = time.perf_counter()
+    res = replay(recs, lambda: GestureFilter(window, votes, dwell), throttle)
+    wall = time.perf_counter() - t0
+    duration = float(recs["t"][-1] - recs["t"][0])
+    rec_raw = recs["raw_command"].astype("U1")
+    rec_cmd = recs["command"].astype("U1")
+    print(f"frames:            {len(recs)}")
+    print(f"session length:    {duration:.1f} s (replayed in {wall:.3f} s, {duration / max(wall, 1e-9):.0f}x real time)")
+    print(f"raw mismatches:    {int((res['raw_command'] != rec_raw).sum())}")
+    print(f"sent mismatches:   {int((res['command'] != rec_cmd).sum())}")
+    print(f"settings:          window {window}, votes {votes}, dwell {dwell:g} s, throttle {throttle:g} s"
+          f"{'' if rec['window'] else ' (not recorded; defaults)'}")
+    print(f"datagrams:         {int(res['sent'].sum())} ({res['sent'].sum() / max(duration, 1e-9):.1f}/s)")
+    print(f"filter:            {res['filter']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Client-side time series of the telemetry the car pushes.
+
+The firmware sends a small datagram every 500 ms (protocol.py has the
+layout): smoothed battery, WiFi RSSI, loop() time and the last control
+sequence it applied. TelemetrySeries subscribes to a CarLink and appends
+each sample to a fixed-size structured numpy ring on the link thread.
+Readers (GUI timer, metrics exporters) never take a lock: the writer
+fills the slot before publishing it by bumping the counter, and readers
+re-read the counter after copying and drop the oldest slots the writer
+reached meanwhile (the seqlock idea of InferenceClient.latest).
+
+    series = TelemetrySeries()
+    link.subscribe(series.on_datagram)
+    series.window("battery_pct", 60)    # -> (min, mean, max) over the last minute
+"""
+import time
+
+import numpy as np
+
+from protocol import TEL_FLAG_CTRL_SEQ, decode_telemetry
+
+SAMPLE_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("battery_v", "<f4"),
+    ("battery_pct", "<f4"),
+    ("rssi", "<f4"),          # NaN when the car doesn't know (AP mode)
+    ("loop_avg_ms", "<f4"),
+    ("loop_max_ms", "<f4"),
+])
+FIELDS = SAMPLE_DTYPE.names[1:]
+
+
+class TelemetrySeries:
+    def __init__(self, size=1200):      # 10 minutes at 2 Hz
+        self._buf = np.zeros(size, SAMPLE_DTYPE)
+        self._n = 0
+        self._last = None                # (time, Telemetry)
+        self._last_seq = None
+        self.received = 0
+        self.lost = 0                    # gaps in the telemetry sequence
+        self.restarts = 0                # car rebooted (sequence jumped back)
+
+    # -------- writer (link thread) --------
+    def on_datagram(self, data):
+        """CarLink subscriber; ignores anything that isn't telemetry. Returns True if it was."""
+        tel = decode_telemetry(data)
+        if tel is None:
+            return False
+        self.push(tel)
+        return True
+
+    def push(self, tel, t=None):
+        t = time.time() if t is None else t
+        if self._last_seq is not None:
+            gap = (tel.seq - self._last_seq - 1) & 0xFFFF
+            if gap < 0x8000:
+                self.lost += gap
+            else:
+                self.restarts += 1
+        self._last_seq = tel.seq
+        slot = self._buf[self._n % len(self._buf)]
+        slot["t"] = t
+        slot["battery_v"] = tel.battery_mv / 1000.0
+        slot["battery_pct"] = tel.battery_pct
+        slot["rssi"] = tel.rssi if tel.rssi else np.nan
+        slot["loop_avg_ms"] = tel.loop_avg_us / 1000.0
+        slot["loop_max_ms"] = tel.loop_max_us / 1000.0
+        self._last = (t, tel)
+        self._n += 1                     # publish
+        self.received += 1
+
+    # -------- readers (any thread) --------
+    def __len__(self):
+        return min(self._n, len(self._buf))
+
+    def latest(self):
+        """Newest Telemetry, or None before the first datagram."""
+        last = self._last
+        return None if last is None else last[1]
+
+    def age(self):
+        """Seconds since the last datagram (inf before the first one)."""
+        last = self._last
+        return float("inf") if last is None else time.time() - last[0]
+
+    def ctrl_seq(self):
+        """Sequence number of the last control datagram the car applied, or None."""
+        tel = self.latest()
+        return tel.ctrl_seq if tel is not None and tel.flags & TEL_FLAG_CTRL_SEQ else None
+
+    def samples(self, seconds=None):
+        """Copy of the buffered samples (oldest first), optionally only the last `seconds`."""
+        n, size = self._n, len(self._buf)
+        if n <= size:
+            out = self._buf[:n].copy()
+        else:
+            i = n % size
+            out = np.concatenate((self._buf[i:], self._buf[:i]))
+        # Slots n .. self._n (the last one possibly half-written) may have been rewritten
+        # during the copy; in a full ring they are the oldest ones we copied.
+        stale = self._n + 1 - size - max(0, n - size)
+        if stale > 0:
+            out = out[stale:]
+        if seconds is not None:
+            out = out[out["t"] >= time.time() - seconds]
+        return out
+
+    def window(self, field, seconds=60.0):
+        """(min, mean, max) of `field` over the last `seconds`, or None without samples."""
+        v = self.samples(seconds)[field]
+        v = v[~np.isnan(v)]
+        if not len(v):
+            return None
+        return float(v.min()), float(v.mean()), float(v.max())
+
+    def summary(self, seconds=60.0):
+        """JSON-able snapshot for the metrics exporters."""
+        tel = self.latest()
+        out = {"received": self.received, "lost": self.lost, "restarts": self.restarts,
+               "age_s": None if tel is None else round(self.age(), 2)}
+        if tel is None:
+            return out
+        out.update(direction=tel.direction, ctrl_seq=self.ctrl_seq())
+        rows = self.samples(seconds)
+        for field in FIELDS:
+            v = rows[field]
+            v = v[~np.isnan(v)]
+            if len(v):
+                out[field] = {"last": round(float(v[-1]), 3), "min": round(float(v.min()), 3),
+                              "mean": round(float(v.mean()), 3), "max": round(float(v.max()), 3)}
+        return out
@@ -0,0 +1,27 @@
+from gesture_filter import GestureFilter
+
+
+def feed(filt, commands, dt=0.1, t0=100.0):
+    return [filt.update(c, 1.0, now=t0 + i * dt) for i, c in enumerate(commands)]
+
+
+def test_confident_flicker_does_not_switch():
+    filt = GestureFilter(window=5, votes=3, min_dwell=0.25)
+    feed(filt, "FFFFF")
+    out = feed(filt, "BF" * 20, t0=101.0)
+    assert set(out) == {"F"}
+    assert filt.transitions == 1
+
+
+def test_steady_gesture_still_switches():
+    filt = GestureFilter(window=5, votes=3, min_dwell=0.25)
+    feed(filt, "FFFFF")
+    out = feed(filt, "BBBBB", t0=101.0)
+    assert out[-1] == "B"
+    assert out.index("B") <= 3
+
+
+def test_stop_is_immediate():
+    filt = GestureFilter()
+    feed(filt, "FFFFF")
+    assert filt.update("S", 1.0, now=101.0) == "S"